@@ -0,0 +1,95 @@
+import argparse
+import statistics
+import time
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from helper.translate_model import Translator
+from helper.model_embedding import GemmEmbedding
+from helper.inference_backend import BACKENDS
+
+PROMPTS = [
+    "Tìm tất cả người dùng có tên chứa Bảo",
+    "Có bao nhiêu dự án trong hệ thống?",
+    "Liệt kê các công việc quá hạn trong tuần này",
+    "Tìm các nhiệm vụ được giao cho Phúc Hào trong dự án Soctrip Travel",
+    "Đếm số công việc theo trạng thái của từng sprint",
+    "Liệt kê các thành viên quản trị của workspace",
+    "Tìm các dự án được tạo trong tháng trước",
+    "Những công việc nào có độ ưu tiên cao nhưng chưa hoàn thành?",
+]
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct))
+
+def time_calls(func, inputs, repeat):
+    latencies=[]
+    outputs=[]
+    for _ in range(repeat):
+        outputs=[]
+        for item in inputs:
+            start=time.perf_counter()
+            outputs.append(func(item))
+            latencies.append((time.perf_counter()-start)*1000)
+    return latencies, outputs
+
+def token_overlap(a, b):
+    a_tokens=set(a.lower().split())
+    b_tokens=set(b.lower().split())
+    if not a_tokens and not b_tokens:
+        return 1.0
+    return len(a_tokens & b_tokens)/len(a_tokens | b_tokens)
+
+def report(name, backend, latencies, accuracy, load_seconds):
+    print(f"{name:<10} {backend:<8} load={load_seconds:6.2f}s "
+          f"p50={percentile(latencies, 50):8.2f}ms p95={percentile(latencies, 95):8.2f}ms "
+          f"mean={statistics.mean(latencies):8.2f}ms accuracy={accuracy:.4f}")
+
+def bench_translator(backends, repeat):
+    reference=None
+    for backend in backends:
+        start=time.perf_counter()
+        translator=Translator(backend=backend)
+        load_seconds=time.perf_counter()-start
+        latencies, outputs=time_calls(translator.translate, PROMPTS, repeat)
+        if reference is None:
+            reference=outputs
+        accuracy=statistics.mean(token_overlap(a, b) for a, b in zip(reference, outputs))
+        report("translator", backend, latencies, accuracy, load_seconds)
+        del translator
+
+def bench_embedder(backends, repeat):
+    reference=None
+    for backend in backends:
+        start=time.perf_counter()
+        embedder=GemmEmbedding(backend=backend)
+        load_seconds=time.perf_counter()-start
+        latencies, outputs=time_calls(embedder.embed_query, PROMPTS, repeat)
+        vectors=np.asarray(outputs, dtype=np.float32)
+        vectors/=np.linalg.norm(vectors, axis=1, keepdims=True)
+        if reference is None:
+            reference=vectors
+        accuracy=float(np.mean(np.sum(reference*vectors, axis=1)))
+        report("embedder", backend, latencies, accuracy, load_seconds)
+        del embedder
+
+def main():
+    parser=argparse.ArgumentParser(description="Compare latency and output drift of inference backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--models", nargs="+", default=["translator", "embedder"],
+                        choices=["translator", "embedder"])
+    args=parser.parse_args()
+
+    # The first backend is the reference the others are scored against
+    backends=["default"]+[backend for backend in args.backends if backend!="default"]
+    if "translator" in args.models:
+        bench_translator(backends, args.repeat)
+    if "embedder" in args.models:
+        bench_embedder(backends, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The replay runs fully offline, the real credentials are never used
+for name, value in {
+    "GEMINI_AI_API_KEY": "offline",
+    "OPEN_AI_API_KEY": "offline",
+    "ATLAS_CONNECTION_STRING": "mongodb://localhost:27017",
+    "ATLAS_DB_NAME": "text2query_bench",
+    "ATLAS_DB_RAG": "text2query_bench_rag",
+    "ATLAS_COLLECTION_RAG": "chunks",
+    "INDEX_NAME": "vector_index",
+    "MODEL_REGISTRY": '{"gemini": "offline", "openai": "offline", "translator": "offline", "embedding": "offline"}',
+    "REDIS_HOST": "localhost",
+    "REDIS_USERNAME": "default",
+    "REDIS_PASSWORD": "offline",
+}.items():
+    os.environ.setdefault(name, value)
+
+import fakeredis
+import mongomock
+from bson import ObjectId
+from langchain.schema import Document
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from configs.settings import settings
+from configs.paths import DATA_DIR
+from helper.metrics import metrics
+from helper.guideline_store import GuidelineStore
+from helper.query_guard import QueryGuard
+from helper.redis_checkpointer import RedisCheckpointSaver
+from helper.translation_cache import CachedTranslator
+from text2query.services import services
+from text2query.graph import Text2QueryPipeline
+
+# Prompts with dynamic dates, the guideline file has none
+DATE_PROMPTS = [
+    {"prompt": "Find tasks due in the next 5 days",
+     "query": {"collection": "tasks", "aggregate": [
+         {"$match": {"dueDate": {"$gte": {"__datetime__": "NOW"}, "$lte": {"__datetime__": "IN_5_DAYS"}}}}]}},
+    {"prompt": "Count overdue tasks that are not completed",
+     "query": {"collection": "tasks", "aggregate": [
+         {"$match": {"completed": False, "dueDate": {"$lt": {"__datetime__": "TODAY"}}}},
+         {"$count": "overdue"}]}},
+    {"prompt": "List projects created last month",
+     "query": {"collection": "projects", "aggregate": [
+         {"$match": {"createdAt": {"$gte": {"__datetime__": "LAST_MONTH"}}}},
+         {"$project": {"name": 1, "createdAt": 1}}]}},
+    {"prompt": "Tasks updated in the last 7 days grouped by status",
+     "query": {"collection": "tasks", "aggregate": [
+         {"$match": {"updatedAt": {"$gte": {"__datetime__": "7_DAYS_AGO"}}}},
+         {"$group": {"_id": "$status", "count": {"$sum": 1}}}]}},
+]
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+QUESTION_PATTERN = re.compile(r"^\s*(?:User question|Prompt):(.*)$", re.MULTILINE)
+
+def load_corpus(path=None):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            if str(path).endswith(".jsonl"):
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+    with open(DATA_DIR/"syntax_guideline.json", encoding="utf-8") as f:
+        corpus=[{"prompt": obj["prompt"], "query": obj["query"]} for obj in json.load(f)
+                if obj.get("prompt") and obj.get("query")]
+    return corpus+DATE_PROMPTS
+
+class HashingEmbedder:
+    # Bag of words hashed into a fixed vector, close enough to rank chunks without a model
+    def __init__(self, dim=256):
+        self.dim=dim
+
+    def embed_query(self, text):
+        vector=np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)%self.dim]+=1.0
+        norm=np.linalg.norm(vector)
+        return (vector/norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embedding(self, data, batch_size=32):
+        return np.asarray(self.embed_documents(data), dtype=np.float32)
+
+class ReplayVectorSearch:
+    def __init__(self, embedder):
+        self.embedder=embedder
+        self.docs=[]
+        for path in sorted(DATA_DIR.glob("*.json")):
+            with open(path, encoding="utf-8") as f:
+                objects=json.load(f)
+            for obj in objects:
+                page_content=json.dumps(obj, ensure_ascii=False, indent=2)
+                self.docs.append(Document(page_content=page_content, metadata={
+                    "collection_name": obj.get("collection_name", obj.get("name")),
+                    "chunk_type": obj.get("chunk_type", obj.get("type")),
+                    "source": path.name,
+                    "content_hash": hashlib.sha256(page_content.encode("utf-8")).hexdigest()
+                }))
+        self.matrix=np.asarray(embedder.embed_documents([doc.page_content for doc in self.docs]),
+                               dtype=np.float32)
+
+    def search_by_vector(self, vector, top_k=5):
+        start=time.perf_counter()
+        try:
+            scores=self.matrix@np.asarray(vector, dtype=np.float32)
+            top=np.argsort(-scores)[:top_k]
+            return [(self.docs[idx], float((1+scores[idx])/2)) for idx in top]
+        finally:
+            metrics.observe("vector_search_seconds", time.perf_counter()-start, {"backend": "replay"})
+
+    def search_with_score(self, prompt, top_k=5):
+        return self.search_by_vector(self.embedder.embed_query(prompt), top_k=top_k)
+
+class IdentityTranslator:
+    def translate(self, text, src_lang="vie_Latn", tgt_lang="eng_Latn"):
+        return text
+
+    def translate_batch(self, texts, src_lang="vie_Latn", tgt_lang="eng_Latn"):
+        return list(texts)
+
+class ReplayLLM:
+    # Answers with the corpus query of the prompt found in the request, like a perfectly accurate model
+    def __init__(self, corpus, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.answers={item["prompt"].strip(): json.dumps(item["query"], ensure_ascii=False) for item in corpus}
+        self.latency_ms=latency_ms
+        self.jitter_ms=jitter_ms
+        self.random=random.Random(seed)
+        self.lock=threading.Lock()
+
+    def invoke(self, prompt):
+        with self.lock:
+            delay=max(self.latency_ms+self.random.uniform(-self.jitter_ms, self.jitter_ms), 0.0)
+        if delay:
+            time.sleep(delay/1000)
+        if '"prompt": "rewritten prompt here"' in prompt:
+            latest=re.search(r'Latest user input:\s*"(.*)"', prompt)
+            content=json.dumps({"prompt": latest.group(1) if latest else ""}, ensure_ascii=False)
+        else:
+            # The context also quotes guideline prompts, only the question line identifies the request
+            question=QUESTION_PATTERN.search(prompt)
+            content=self.answers.get(question.group(1).strip() if question else "",
+                                     '{"collection": "users", "aggregate": []}')
+            content=f"```json\n{content}\n```"
+        return AIMessage(content=content, usage_metadata={"input_tokens": len(prompt)//4,
+                                                          "output_tokens": len(content)//4,
+                                                          "total_tokens": (len(prompt)+len(content))//4})
+
+def seed_database(db, documents, seed=0):
+    rng=random.Random(seed)
+    now=datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    def some_date():
+        return now-datetime.timedelta(days=rng.randint(-30, 90), hours=rng.randint(0, 23))
+
+    names=["Bảo", "Phương", "Phúc Hào", "Minh", "Lan", "Tuấn", "Hà", "Quang"]
+    users=[{"_id": ObjectId(), "name": f"{rng.choice(names)} {idx}",
+            "email": f"{'phuchao' if idx%7==0 else 'user'}{idx}@example.com", "password": "hashed"}
+           for idx in range(max(documents//10, 8))]
+    def members():
+        return [{"_id": ObjectId(), "user": user["_id"], "role": rng.choice(["admin", "member"]),
+                 "joinedAt": some_date()} for user in rng.sample(users, min(3, len(users)))]
+
+    workspaces=[{"_id": ObjectId(), "name": f"Workspace {idx}", "description": "", "owner": rng.choice(users)["_id"],
+                 "members": members(), "createdAt": some_date(), "updatedAt": None}
+                for idx in range(max(documents//100, 2))]
+    project_names=["Soctrip Travel", "First Project"]+[f"Project {idx}" for idx in range(max(documents//20, 2))]
+    projects=[{"_id": ObjectId(), "workspace": rng.choice(workspaces)["_id"], "name": name,
+               "description": f"{name} description", "owner": rng.choice(users)["_id"], "members": members(),
+               "sprints": [{"_id": ObjectId(), "name": f"{name} sprint {idx}", "startDate": some_date(),
+                            "endDate": some_date(), "createdAt": some_date(), "updatedAt": None}
+                           for idx in range(3)],
+               "createdAt": some_date(), "updatedAt": some_date()}
+              for name in project_names]
+    tasks=[]
+    for idx in range(documents):
+        project=rng.choice(projects)
+        tasks.append({"_id": ObjectId(), "project": project["_id"], "sprint": rng.choice(project["sprints"])["_id"],
+                      "title": f"Task {idx}",
+                      "description": rng.choice(["Set up MongoDB indexes", "Write API docs", "Fix login bug"]),
+                      "priority": rng.choice(["low", "medium", "high"]),
+                      "status": rng.choice(["pending", "in-progress", "completed"]),
+                      "dueDate": some_date(), "owner": rng.choice(users)["_id"],
+                      "assignee": rng.choice(users)["_id"], "completed": rng.random()<0.4,
+                      "comments": [], "createdAt": some_date(), "updatedAt": some_date()})
+
+    for name, docs in (("users", users), ("workspaces", workspaces), ("projects", projects), ("tasks", tasks)):
+        db[name].delete_many({})
+        db[name].insert_many(docs)
+    return {"users": len(users), "workspaces": len(workspaces), "projects": len(projects), "tasks": len(tasks)}
+
+def install_services(args, corpus):
+    client=mongomock.MongoClient()
+    server=fakeredis.FakeServer()
+    embedder=HashingEmbedder()
+    if args.checkpointer=="redis":
+        checkpointer=RedisCheckpointSaver(fakeredis.FakeRedis(server=server),
+                                          ttl=settings.checkpoint_ttl, keep_last=settings.checkpoint_keep_last)
+    else:
+        checkpointer=MemorySaver()
+
+    settings.semantic_cache_enabled=not args.no_semantic_cache
+    services.instances.update({
+        "llm": ReplayLLM(corpus, latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, seed=args.seed),
+        "embedder": embedder,
+        "vector_search": ReplayVectorSearch(embedder),
+        "client": client,
+        "redis": fakeredis.FakeRedis(server=server, decode_responses=True),
+        "checkpointer": checkpointer,
+        # Confirms in the warm phase must not append to the real guideline log
+        "guideline_store": GuidelineStore(Path(tempfile.mkdtemp(prefix="text2query_bench_"))/"syntax_guideline.jsonl"),
+        "translator": CachedTranslator(IdentityTranslator(), max_size=settings.translation_cache_size,
+                                       ttl=settings.translation_cache_ttl),
+        # mongomock cannot explain pipelines
+        "query_guard": QueryGuard(policy=settings.query_guard_policy,
+                                  max_documents=settings.query_max_documents,
+                                  max_time_ms=settings.query_max_time_ms,
+                                  allow_disk_use=settings.query_allow_disk_use,
+                                  max_lookups=settings.query_max_lookups,
+                                  use_explain=False)
+    })
+    return seed_database(client[settings.atlas_db_name], args.documents, seed=args.seed)
+
+class SampleRecorder:
+    # Keeps every histogram observation, Metrics only keeps buckets
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.samples={}
+        self.observe=metrics.observe
+        metrics.observe=self.record
+
+    def record(self, name, seconds, labels=None):
+        self.observe(name, seconds, labels)
+        key=name if not labels else f"{name}{{{','.join(f'{k}={v}' for k, v in sorted(labels.items()))}}}"
+        with self.lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+    def reset(self):
+        with self.lock:
+            samples, self.samples=self.samples, {}
+        return samples
+
+def summarize(latencies):
+    values=np.asarray(latencies, dtype=np.float64)*1000
+    return {
+        "count": int(values.size),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+def clear_caches():
+    services.semantic_cache.clear()
+    services.translator.clear()
+
+def prime_caches(pipeline, corpus):
+    # Only confirmed queries enter the semantic cache, confirm every corpus prompt once like a user would
+    for item in corpus:
+        session_id, _, _=pipeline.start_query(item["prompt"])
+        pipeline.confirm(session_id)
+
+def run_level(pipeline, corpus, sessions, concurrency, recorder, rng, phase):
+    prompts=[rng.choice(corpus)["prompt"] for _ in range(sessions)]
+    latencies=[]
+    failures=[]
+    lock=threading.Lock()
+
+    def run_session(prompt):
+        start=time.perf_counter()
+        try:
+            _, result, _=pipeline.start_query(prompt)
+            failed=bool(result) and "Error" in result[0]
+        except Exception as e:
+            failed=True
+            result=[{"exception": repr(e)}]
+        elapsed=time.perf_counter()-start
+        with lock:
+            latencies.append(elapsed)
+            if failed:
+                failures.append({"prompt": prompt, "result": result[:1]})
+
+    cache_hits=services.semantic_cache.stats()["hits"]
+    recorder.reset()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start=time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_session, prompts))
+    wall=time.perf_counter()-start
+    samples=recorder.reset()
+
+    return {
+        "phase": phase,
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "semantic_cache_hits": services.semantic_cache.stats()["hits"]-cache_hits,
+        "wall_seconds": wall,
+        "throughput_per_second": sessions/wall if wall else 0.0,
+        "failures": len(failures),
+        "failure_samples": failures[:5],
+        "end_to_end": summarize(latencies),
+        "nodes": {key[len("pipeline_node_seconds{node="):-1]: summarize(values)
+                  for key, values in sorted(samples.items()) if key.startswith("pipeline_node_seconds{")},
+        "dependencies": {key: summarize(values) for key, values in sorted(samples.items())
+                         if not key.startswith("pipeline_node_seconds{")},
+        "peak_traced_mb": tracemalloc.get_traced_memory()[1]/2**20 if tracemalloc.is_tracing() else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+    }
+
+def print_level(level):
+    e2e=level["end_to_end"]
+    traced=f" peak_traced={level['peak_traced_mb']:.1f}MB" if level["peak_traced_mb"] is not None else ""
+    print(f"\nphase={level['phase']} concurrency={level['concurrency']} sessions={level['sessions']} "
+          f"throughput={level['throughput_per_second']:.2f}/s failures={level['failures']} "
+          f"cache_hits={level['semantic_cache_hits']} "
+          f"max_rss={level['max_rss_mb']:.1f}MB{traced}")
+    print(f"{'stage':<36} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows=[("end_to_end", e2e)]+list(level["nodes"].items())+list(level["dependencies"].items())
+    for name, stats in rows:
+        print(f"{name[:36]:<36} {stats['count']:>6} {stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms "
+              f"{stats['p99_ms']:>7.2f}ms {stats['max_ms']:>7.2f}ms")
+
+def compare(report, baseline, tolerance):
+    regressions=[]
+    levels={(level.get("phase", "cold"), level["concurrency"]): level for level in baseline.get("levels", [])}
+    for level in report["levels"]:
+        previous=levels.get((level["phase"], level["concurrency"]))
+        if previous is None:
+            continue
+        label=f"phase={level['phase']} concurrency={level['concurrency']}"
+        if level["throughput_per_second"]<previous["throughput_per_second"]*(1-tolerance):
+            regressions.append(f"{label} throughput "
+                               f"{previous['throughput_per_second']:.2f}/s -> {level['throughput_per_second']:.2f}/s")
+        current=[("end_to_end", level["end_to_end"])]+list(level["nodes"].items())
+        before={"end_to_end": previous["end_to_end"], **previous.get("nodes", {})}
+        for name, stats in current:
+            if name in before and stats["p95_ms"]>before[name]["p95_ms"]*(1+tolerance):
+                regressions.append(f"{label} {name} p95 "
+                                   f"{before[name]['p95_ms']:.2f}ms -> {stats['p95_ms']:.2f}ms")
+    return regressions
+
+def main():
+    parser=argparse.ArgumentParser(description="Replay a prompt corpus through the Text2Query graph offline")
+    parser.add_argument("--corpus", help="JSON or JSONL file of {prompt, query}, defaults to syntax_guideline.json")
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--documents", type=int, default=2000, help="Seeded tasks, other collections scale with it")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM response time")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--checkpointer", choices=["redis", "memory"], default="redis")
+    parser.add_argument("--no-semantic-cache", action="store_true")
+    parser.add_argument("--phases", nargs="+", choices=["cold", "warm"], default=["cold", "warm"],
+                        help="cold starts every level with empty caches, warm first confirms every corpus prompt")
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded passes over the corpus")
+    parser.add_argument("--trace-memory", action="store_true", help="Track peak Python allocations (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Previous JSON report, exit 1 when p95 or throughput regress")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args=parser.parse_args()
+
+    corpus=load_corpus(args.corpus)
+    seeded=install_services(args, corpus)
+    recorder=SampleRecorder()
+
+    pipeline=Text2QueryPipeline()
+    for _ in range(args.warmup):
+        for item in corpus:
+            pipeline.start_query(item["prompt"])
+    # The warm-up only loads code paths, its cache entries must not leak into the measured runs
+    clear_caches()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    rng=random.Random(args.seed)
+    report={"corpus": len(corpus), "seeded": seeded, "settings": {
+        "checkpointer": args.checkpointer,
+        "semantic_cache": settings.semantic_cache_enabled,
+        "llm_latency_ms": args.llm_latency_ms,
+        "documents": args.documents
+    }, "levels": []}
+    print(f"corpus={len(corpus)} prompts seeded={seeded}")
+    for phase in args.phases:
+        for concurrency in args.concurrency:
+            clear_caches()
+            if phase=="warm":
+                prime_caches(pipeline, corpus)
+            level=run_level(pipeline, corpus, args.sessions, concurrency, recorder, rng, phase)
+            report["levels"].append(level)
+            print_level(level)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions=compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 from langchain_community.document_transformers.openai_functions import create_metadata_tagger
 from langchain_openai import ChatOpenAI
-from pymongo import MongoClient
+from pymongo import UpdateOne
 from langchain.schema import Document
+from itertools import islice
+import argparse
 import datetime
+import hashlib
 import json
+import time
 import torch
 
 import os
@@ -13,12 +17,110 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from helper.model_embedding import GemmEmbedding
 from configs.settings import settings
 from configs.paths import DATA_DIR
+from helper.connections import get_mongo_client
+from helper.metrics import metrics
+from helper.guideline_store import GuidelineStore
+from helper.translation_cache import detect_language
+
+def iter_json_array(file_path, read_size=65536):
+    decoder=json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer=""
+        started=False
+        eof=False
+        while True:
+            buffer=buffer.lstrip()
+            if not started:
+                if not buffer and not eof:
+                    chunk=f.read(read_size)
+                    eof=not chunk
+                    buffer+=chunk
+                    continue
+                if not buffer.startswith("["):
+                    raise ValueError(f"{file_path} must contain a JSON array")
+                buffer=buffer[1:]
+                started=True
+                continue
+
+            if buffer.startswith(","):
+                buffer=buffer[1:]
+                continue
+            if buffer.startswith("]"):
+                return
+
+            try:
+                obj, end=decoder.raw_decode(buffer)
+                if end==len(buffer) and not eof:
+                    raise json.JSONDecodeError("Value may continue", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk=f.read(read_size)
+                eof=not chunk
+                buffer+=chunk
+                continue
+
+            yield obj
+            buffer=buffer[end:]
+
+def iter_objects(file_path):
+    if file_path.suffix==".jsonl":
+        for _, entry in GuidelineStore(file_path).iter_entries():
+            entry.pop("content_hash", None)
+            yield entry
+    else:
+        yield from iter_json_array(file_path)
+
+def text_values(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from text_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from text_values(item)
+    elif isinstance(value, str):
+        yield value
+
+def extract_metadata(obj):
+    # Known layouts of the data files already say what they describe, no LLM needed
+    if not isinstance(obj, dict):
+        return None
+    if obj.get("chunk_type") and obj.get("collection_name"):
+        chunk_type=obj["chunk_type"]
+        collection_name=obj["collection_name"]
+    elif obj.get("type")=="schema" and obj.get("name"):
+        chunk_type="schema"
+        collection_name=obj["name"]
+    elif obj.get("type")=="sub-schema" and obj.get("name") and obj.get("parent_collection"):
+        chunk_type="sub-schema"
+        parents=obj["parent_collection"]
+        collection_name=[f"{parent}.{obj['name']}" for parent in parents] if isinstance(parents, list) \
+            else f"{parents}.{obj['name']}"
+    else:
+        return None
+
+    languages=(obj.get("metadata") or {}).get("languages") if isinstance(obj.get("metadata"), dict) else None
+    if not languages:
+        languages=detect_language(" ".join(text_values({key: value for key, value in obj.items()
+                                                          if key not in ("query", "fields")})))
+    return {"collection_name": collection_name, "chunk_type": chunk_type, "languages": languages}
+
+def batched(iterable, size):
+    iterator=iter(iterable)
+    while batch:=list(islice(iterator, size)):
+        yield batch
+
+def content_hash(obj):
+    canonical=json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
 class Chunking:
-    def __init__(self):
-        self.client=MongoClient(settings.atlas_connection_string)
+    def __init__(self, embedder=None):
+        self.client=get_mongo_client()
         self.db=self.client[settings.atlas_db_rag]
         self.embedding_collection= self.db[settings.atlas_collection_rag]
+        self.embedding_collection.create_index([("source", 1), ("content_hash", 1)])
+        self.ingest_state=self.db[settings.ingest_state_collection]
 
         self.schema = {
             "type": "object",
@@ -43,64 +145,197 @@ class Chunking:
         }
 
 
-        self.llm = ChatOpenAI(api_key=settings.open_ai_api_key, temperature=0, model=settings.model_registry["openai"])
+        self.document_transformer=None
+        self.embedder=embedder or GemmEmbedding()
 
-        self.document_transformer = create_metadata_tagger(metadata_schema=self.schema, llm=self.llm)
-        self.embedder=GemmEmbedding()
+    def tag_documents(self, docs):
+        # Fallback for objects extract_metadata does not recognize, one batch per ingest batch
+        if not settings.ingest_llm_fallback:
+            return docs
+        if self.document_transformer is None:
+            llm=ChatOpenAI(api_key=settings.open_ai_api_key, temperature=0, model=settings.model_registry["openai"])
+            self.document_transformer=create_metadata_tagger(metadata_schema=self.schema, llm=llm)
+        return self.document_transformer.transform_documents(docs)
         
     
-    def chunking(self):
-        for file_path in DATA_DIR.iterdir():
-            file_name=file_path.name
-            if self.embedding_collection.find_one({"source": file_name}):
-                print(f"File {file_name} has been exists in collection, skip.")
-                continue
-
-            with open(file_path, "r", encoding="utf-8") as f:
-                objects=json.load(f)
-
-            docs = []
-            for obj in objects:
-                docs.append(
-                    Document(
-                        page_content=json.dumps(obj, ensure_ascii=False, indent=2),
-                        metadata={"source": file_name}
-                    )
-                )
-                
-            tagged_docs = self.document_transformer.transform_documents(docs)
-
-            for chunk in tagged_docs:
-                raw_doc = {
-                    "collection_name": chunk.metadata.get("collection_name", "default_collection"),
-                    "chunk_type": chunk.metadata.get("chunk_type", "schema"),
-                    "text": chunk.page_content,
-                    "source": file_name,
-                    "metadata": {
-                        "languages": chunk.metadata.get("languages", ["en"]),
-                        "created_at": chunk.metadata.get("created_at", datetime.datetime.now())
-                    }
-                }
+    def build_raw_doc(self, chunk, file_name):
+        return {
+            "collection_name": chunk.metadata.get("collection_name", "default_collection"),
+            "chunk_type": chunk.metadata.get("chunk_type", "schema"),
+            "text": chunk.page_content,
+            "source": file_name,
+            "metadata": {
+                "languages": chunk.metadata.get("languages", ["en"]),
+                "created_at": chunk.metadata.get("created_at", datetime.datetime.now())
+            }
+        }
 
-                content_embedding = f"""
+    def build_content_embedding(self, raw_doc):
+        return f"""
                 Collection: {raw_doc['collection_name']}
                 Type: {raw_doc['chunk_type']}
                 Language: {raw_doc['metadata']['languages']}
                 Text: {raw_doc['text']}
                 """
-                
-                embedding_vector = self.embedder.embedding(content_embedding).tolist()
 
-                raw_doc["embedding"] = embedding_vector
+    def existing_hashes(self, file_name):
+        hashes={}
+        backfill=[]
+        for doc in self.embedding_collection.find({"source": file_name}, {"content_hash": 1, "text": 1}):
+            chunk_hash=doc.get("content_hash")
+            if not chunk_hash:
+                try:
+                    chunk_hash=content_hash(json.loads(doc.get("text", "")))
+                except json.JSONDecodeError:
+                    continue
+                backfill.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"content_hash": chunk_hash}}))
+            hashes.setdefault(chunk_hash, []).append(doc["_id"])
+        if backfill:
+            self.embedding_collection.bulk_write(backfill, ordered=False)
+        return hashes
 
-                chunk_id = self.embedding_collection.insert_one(raw_doc).inserted_id
-                print(f"Inserted chunk {chunk_id} from {file_name}, embedding_dim={len(embedding_vector)}")
-                
-                torch.cuda.empty_cache()
+    def embed_and_upsert(self, objects, file_name):
+        docs = []
+        unknown = []
+        for obj in objects:
+            metadata=extract_metadata(obj)
+            doc=Document(
+                    page_content=json.dumps(obj, ensure_ascii=False, indent=2),
+                    metadata={"source": file_name, "content_hash": content_hash(obj), **(metadata or {})}
+                )
+            docs.append(doc)
+            if metadata is None:
+                unknown.append(len(docs)-1)
+            
+        tagged_docs=list(docs)
+        if unknown:
+            for idx, chunk in zip(unknown, self.tag_documents([docs[idx] for idx in unknown])):
+                tagged_docs[idx]=chunk
+            metrics.increment("ingest_llm_tagged_total", len(unknown))
+
+        raw_docs=[]
+        for doc, chunk in zip(docs, tagged_docs):
+            raw_doc=self.build_raw_doc(chunk, file_name)
+            raw_doc["content_hash"]=doc.metadata["content_hash"]
+            raw_docs.append(raw_doc)
+        contents=[self.build_content_embedding(raw_doc) for raw_doc in raw_docs]
+        embedding_vectors=self.embedder.embedding(contents, batch_size=settings.ingest_batch_size).tolist()
+
+        requests=[]
+        for raw_doc, embedding_vector in zip(raw_docs, embedding_vectors):
+            raw_doc["embedding"] = embedding_vector
+            requests.append(UpdateOne({"source": file_name, "content_hash": raw_doc["content_hash"]},
+                                      {"$set": raw_doc}, upsert=True))
+
+        self.embedding_collection.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def index_file(self, file_path):
+        file_name=file_path.name
+        existing=self.existing_hashes(file_name)
+
+        seen=set()
+        pending=[]
+        upserted=0
+        for obj in iter_objects(file_path):
+            chunk_hash=content_hash(obj)
+            if chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            if chunk_hash in existing:
+                continue
+
+            pending.append(obj)
+            if len(pending)>=settings.ingest_batch_size:
+                upserted+=self.embed_and_upsert(pending, file_name)
+                pending=[]
+
+        if pending:
+            upserted+=self.embed_and_upsert(pending, file_name)
+
+        stale_ids=[_id for chunk_hash, ids in existing.items() if chunk_hash not in seen for _id in ids]
+        if stale_ids:
+            self.embedding_collection.delete_many({"_id": {"$in": stale_ids}})
+
+        print(f"Indexed {file_name}: {upserted} upserted, {len(stale_ids)} deleted, "
+              f"{len(seen)-upserted} unchanged")
+
+    def index_log(self, file_path):
+        # Append-only logs are read from where the last run stopped
+        file_name=file_path.name
+        stat=file_path.stat()
+        state=self.ingest_state.find_one({"_id": file_name}) or {}
+        store=GuidelineStore(file_path)
+        if state.get("inode")!=stat.st_ino or state.get("offset", 0)>stat.st_size:
+            # New or compacted log, index it whole; lines appended meanwhile are picked up next time
+            offset=max((end for end, _ in store.iter_entries()), default=0)
+            self.index_file(file_path)
+            self.ingest_state.update_one({"_id": file_name}, {"$set": {"inode": stat.st_ino, "offset": offset}},
+                                         upsert=True)
+            return
+
+        offset=state["offset"]
+        upserted=0
+        for batch in batched(store.iter_entries(offset), settings.ingest_batch_size):
+            objects={}
+            for _, entry in batch:
+                entry.pop("content_hash", None)
+                objects.setdefault(content_hash(entry), entry)
+            existing={doc["content_hash"] for doc in self.embedding_collection.find(
+                {"source": file_name, "content_hash": {"$in": list(objects)}}, {"content_hash": 1})}
+            pending=[obj for chunk_hash, obj in objects.items() if chunk_hash not in existing]
+            if pending:
+                upserted+=self.embed_and_upsert(pending, file_name)
+            offset=batch[-1][0]
+            self.ingest_state.update_one({"_id": file_name}, {"$set": {"offset": offset}})
+        if upserted:
+            print(f"Indexed {file_name}: {upserted} appended")
+
+    def index_path(self, file_path):
+        if file_path.suffix==".jsonl":
+            self.index_log(file_path)
+        else:
+            self.index_file(file_path)
+
+    def data_files(self):
+        return [file_path for file_path in DATA_DIR.iterdir() if file_path.suffix in (".json", ".jsonl")]
+
+    def chunking(self):
+        file_names=[]
+        for file_path in self.data_files():
+            file_names.append(file_path.name)
+            self.index_path(file_path)
+
+        removed=self.embedding_collection.delete_many({"source": {"$nin": file_names}}).deleted_count
+        if removed:
+            print(f"Deleted {removed} chunks from removed files")
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def watch(self, interval):
+        mtimes={}
+        while True:
+            for file_path in self.data_files():
+                mtime=file_path.stat().st_mtime_ns
+                if mtimes.get(file_path.name)!=mtime:
+                    try:
+                        self.index_path(file_path)
+                        mtimes[file_path.name]=mtime
+                    except (ValueError, json.JSONDecodeError) as e:
+                        print(f"File {file_path.name} is not readable yet, retry: {e}")
+            time.sleep(interval)
 
 def main():
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--watch", action="store_true", help="Keep re-indexing files when they change")
+    parser.add_argument("--interval", type=float, default=settings.ingest_watch_interval)
+    args=parser.parse_args()
+
     chunker=Chunking()
     chunker.chunking()
+    if args.watch:
+        chunker.watch(args.interval)
         
 if __name__  == "__main__":
     main()
\ No newline at end of file
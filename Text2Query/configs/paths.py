@@ -3,4 +3,5 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
 DATA_DIR = ROOT_DIR /"chunking_embedding"/ "data"
+GUIDELINE_LOG = DATA_DIR / "syntax_guideline.jsonl"
 MODEL_DIR = ROOT_DIR / "models"
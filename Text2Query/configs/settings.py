@@ -9,13 +9,78 @@ class Settings(BaseSettings):
     atlas_db_rag: str = Field (..., env="ATLAS_DB_RAG")
     atlas_collection_rag: str = Field (..., env="ATLAS_COLLECTION_RAG")
     index_name: str = Field (..., env="INDEX_NAME")
+    retriever_backend: str = Field ("atlas", env="RETRIEVER_BACKEND")
+    local_index_dir: str = Field ("vector_index", env="LOCAL_INDEX_DIR")
+    local_index_mmap: bool = Field (True, env="LOCAL_INDEX_MMAP")
+    local_index_refresh_interval: float = Field (30.0, env="LOCAL_INDEX_REFRESH_INTERVAL")
     model_registry: dict = Field (...,env="MODEL_REGISTRY")
+    context_top_k: int= Field(10, env="CONTEXT_TOP_K")
+    context_min_score: float= Field(0.6, env="CONTEXT_MIN_SCORE")
+    context_token_budget: int= Field(1500, env="CONTEXT_TOKEN_BUDGET")
+    context_guideline_boost: float= Field(0.05, env="CONTEXT_GUIDELINE_BOOST")
+    template_enabled: bool= Field(True, env="TEMPLATE_ENABLED")
+    template_min_score: float= Field(0.85, env="TEMPLATE_MIN_SCORE")
     max_llm_retry: int =Field(5, env="MAX_LLM_RETRY")
     max_user_retry: int= Field(5, env="MAX_USER_RETRY")
+    warmup_on_startup: bool= Field(True, env="WARMUP_ON_STARTUP")
+    log_level: str= Field("INFO", env="LOG_LEVEL")
+    otel_enabled: bool= Field(False, env="OTEL_ENABLED")
+    pipeline_max_workers: int= Field(16, env="PIPELINE_MAX_WORKERS")
+    semantic_cache_enabled: bool= Field(True, env="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float= Field(0.92, env="SEMANTIC_CACHE_THRESHOLD")
+    semantic_cache_max_size: int= Field(1024, env="SEMANTIC_CACHE_MAX_SIZE")
+    semantic_cache_ttl: int= Field(3600, env="SEMANTIC_CACHE_TTL")
+    llm_cache_enabled: bool= Field(True, env="LLM_CACHE_ENABLED")
+    llm_cache_size: int= Field(512, env="LLM_CACHE_SIZE")
+    llm_cache_ttl: int= Field(3600, env="LLM_CACHE_TTL")
+    llm_cache_redis: bool= Field(True, env="LLM_CACHE_REDIS")
+    translation_cache_size: int= Field(2048, env="TRANSLATION_CACHE_SIZE")
+    translation_cache_ttl: int= Field(86400, env="TRANSLATION_CACHE_TTL")
+    translation_cache_redis: bool= Field(False, env="TRANSLATION_CACHE_REDIS")
+    inference_batching: bool= Field(True, env="INFERENCE_BATCHING")
+    inference_max_batch_size: int= Field(16, env="INFERENCE_MAX_BATCH_SIZE")
+    inference_max_wait_ms: float= Field(10, env="INFERENCE_MAX_WAIT_MS")
+    ingest_batch_size: int= Field(32, env="INGEST_BATCH_SIZE")
+    ingest_llm_fallback: bool= Field(True, env="INGEST_LLM_FALLBACK")
+    ingest_state_collection: str= Field("ingest_offsets", env="INGEST_STATE_COLLECTION")
+    ingest_watch_interval: float= Field(2.0, env="INGEST_WATCH_INTERVAL")
+    result_preview_limit: int= Field(50, env="RESULT_PREVIEW_LIMIT")
+    result_batch_size: int= Field(500, env="RESULT_BATCH_SIZE")
+    result_max_page_size: int= Field(1000, env="RESULT_MAX_PAGE_SIZE")
+    schema_validation_enabled: bool= Field(True, env="SCHEMA_VALIDATION_ENABLED")
+    query_guard_policy: str= Field("limit", env="QUERY_GUARD_POLICY")
+    query_max_documents: int= Field(1000, env="QUERY_MAX_DOCUMENTS")
+    query_max_time_ms: int= Field(10000, env="QUERY_MAX_TIME_MS")
+    query_allow_disk_use: bool= Field(False, env="QUERY_ALLOW_DISK_USE")
+    query_max_lookups: int= Field(3, env="QUERY_MAX_LOOKUPS")
+    query_collscan_threshold: int= Field(10000, env="QUERY_COLLSCAN_THRESHOLD")
+    query_guard_explain: bool= Field(True, env="QUERY_GUARD_EXPLAIN")
+    query_count_ttl: int= Field(300, env="QUERY_COUNT_TTL")
+    index_advisor_enabled: bool= Field(True, env="INDEX_ADVISOR_ENABLED")
+    index_advisor_collection: str= Field("text2query_query_log", env="INDEX_ADVISOR_COLLECTION")
+    index_advisor_queue_size: int= Field(1000, env="INDEX_ADVISOR_QUEUE_SIZE")
+    index_advisor_flush_interval: float= Field(5.0, env="INDEX_ADVISOR_FLUSH_INTERVAL")
+    checkpointer_backend: str= Field("redis", env="CHECKPOINTER_BACKEND")
+    checkpoint_ttl: int= Field(3600, env="CHECKPOINT_TTL")
+    checkpoint_keep_last: int= Field(3, env="CHECKPOINT_KEEP_LAST")
+    history_max_turns: int= Field(20, env="HISTORY_MAX_TURNS")
+    history_prompt_turns: int= Field(5, env="HISTORY_PROMPT_TURNS")
+    history_ttl: int= Field(600, env="HISTORY_TTL")
     redis_host: str= Field(...,env="REDIS_HOST")
     redis_port: int= Field(6379,env="REDIS_PORT")
     redis_username: str=Field(...,env="default")
     redis_password: str=Field(...,env="REDIS_PASSWORD")
+    redis_max_connections: int= Field(50, env="REDIS_MAX_CONNECTIONS")
+    redis_socket_timeout: float= Field(5.0, env="REDIS_SOCKET_TIMEOUT")
+    redis_socket_connect_timeout: float= Field(5.0, env="REDIS_SOCKET_CONNECT_TIMEOUT")
+    redis_health_check_interval: int= Field(30, env="REDIS_HEALTH_CHECK_INTERVAL")
+    mongo_max_pool_size: int= Field(50, env="MONGO_MAX_POOL_SIZE")
+    mongo_min_pool_size: int= Field(0, env="MONGO_MIN_POOL_SIZE")
+    mongo_max_idle_time_ms: int= Field(60000, env="MONGO_MAX_IDLE_TIME_MS")
+    mongo_wait_queue_timeout_ms: int= Field(5000, env="MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    mongo_server_selection_timeout_ms: int= Field(10000, env="MONGO_SERVER_SELECTION_TIMEOUT_MS")
+    mongo_connect_timeout_ms: int= Field(5000, env="MONGO_CONNECT_TIMEOUT_MS")
+    mongo_read_preference: str= Field("primary", env="MONGO_READ_PREFERENCE")
     class Config:
         env_file=".env"
         env_file_encoding="utf-8"    
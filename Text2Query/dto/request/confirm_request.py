@@ -2,5 +2,6 @@ from pydantic import BaseModel
 from typing import Optional
 
 class ConfirmRequest(BaseModel):
+    session_id: str
     new_prompt: Optional[str]=None
     is_confirm: bool
\ No newline at end of file
@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+from typing import Optional
+class Text2QueryResponse(BaseModel):
+    session_id: str
+    result: list[dict]
+    next_page_token: Optional[str]=None
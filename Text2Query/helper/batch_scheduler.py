@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name="micro-batcher"):
+        self.batch_fn=batch_fn
+        self.max_batch_size=max_batch_size
+        self.max_wait=max_wait_ms/1000
+        self.queue=queue.Queue()
+        self.lock=threading.Lock()
+        self.batches=0
+        self.items=0
+        self.worker=threading.Thread(target=self.run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, key, item):
+        future=Future()
+        self.queue.put((key, item, future))
+        return future
+
+    def call(self, key, item):
+        return self.submit(key, item).result()
+
+    def collect(self):
+        batch=[self.queue.get()]
+        deadline=time.monotonic()+self.max_wait
+        while len(batch)<self.max_batch_size:
+            remaining=deadline-time.monotonic()
+            if remaining<=0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch=self.collect()
+            groups={}
+            for key, item, future in batch:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(key, []).append((item, future))
+
+            for key, entries in groups.items():
+                try:
+                    results=self.batch_fn(key, [item for item, _ in entries])
+                except Exception as e:
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    future.set_result(result)
+
+            with self.lock:
+                self.batches+=1
+                self.items+=len(batch)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items/self.batches if self.batches else 0.0,
+                "queued": self.queue.qsize()
+            }
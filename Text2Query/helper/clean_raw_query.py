@@ -1,6 +1,9 @@
 import json
 import datetime
 import re
+import ast
+import io
+import tokenize
 from dateutil.relativedelta import relativedelta  
 def clean_query(raw_query):   
     raw_query = raw_query.strip()
@@ -12,6 +15,87 @@ def clean_query(raw_query):
     raw_query = raw_query.replace("\\n", "").replace("\\t", "").replace("\\r", "")
     return raw_query.strip()
 
+AGGREGATE_CALL = re.compile(r"db\.(?:getCollection\(\s*[\"']([\w.-]+)[\"']\s*\)|([\w-]+))\.aggregate\(\s*(\[.*\])\s*(?:,\s*\{.*\})?\s*\)",
+                            re.DOTALL)
+UNQUOTED_KEY = re.compile(r"([{,]\s*)(\$?[A-Za-z_][\w.$]*)\s*:")
+PYTHON_LITERALS = {"true": "True", "false": "False", "null": "None"}
+
+def extract_json_block(raw_query):
+    starts=[idx for idx in (raw_query.find("{"), raw_query.find("[")) if idx>=0]
+    if not starts:
+        return raw_query
+    start=min(starts)
+    end=max(raw_query.rfind("}"), raw_query.rfind("]"))
+    return raw_query[start:end+1] if end>start else raw_query
+
+def loads_python_literal(raw_query):
+    # Accepts single quotes, trailing commas and true/false/null by reading the text as a Python literal
+    tokens=[]
+    for token in tokenize.generate_tokens(io.StringIO(raw_query).readline):
+        if token.type==tokenize.NAME and token.string in PYTHON_LITERALS:
+            token=token._replace(string=PYTHON_LITERALS[token.string])
+        tokens.append(token)
+    return ast.literal_eval(tokenize.untokenize(tokens))
+
+def try_loads(raw_query):
+    try:
+        return json.loads(raw_query), None
+    except json.JSONDecodeError:
+        pass
+    try:
+        return loads_python_literal(raw_query), "python_literal"
+    except (ValueError, SyntaxError, tokenize.TokenError, MemoryError, RecursionError):
+        pass
+    quoted=UNQUOTED_KEY.sub(lambda m: f'{m.group(1)}"{m.group(2)}":', raw_query)
+    if quoted!=raw_query:
+        try:
+            return loads_python_literal(quoted), "unquoted_keys"
+        except (ValueError, SyntaxError, tokenize.TokenError, MemoryError, RecursionError):
+            pass
+    return None, None
+
+def repair_query(raw_query):
+    repairs=[]
+    text=clean_query(raw_query)
+
+    call=AGGREGATE_CALL.search(text)
+    if call:
+        collection=call.group(1) or call.group(2)
+        pipeline, repair=try_loads(call.group(3))
+        if isinstance(pipeline, list):
+            repairs.append("aggregate_call")
+            if repair:
+                repairs.append(repair)
+            return {"collection": collection, "aggregate": pipeline}, repairs
+
+    block=extract_json_block(text)
+    if block!=text:
+        repairs.append("surrounding_text")
+
+    query, repair=try_loads(block)
+    if repair:
+        repairs.append(repair)
+    if not isinstance(query, dict):
+        return None, repairs
+
+    if "aggregate" not in query and "pipeline" in query:
+        query["aggregate"]=query.pop("pipeline")
+        repairs.append("pipeline_key")
+
+    if isinstance(query.get("aggregate"), str):
+        pipeline, repair=try_loads(query["aggregate"])
+        if isinstance(pipeline, list):
+            query["aggregate"]=pipeline
+            repairs.append("stringified_aggregate")
+            if repair:
+                repairs.append(repair)
+
+    if isinstance(query.get("aggregate"), dict):
+        query["aggregate"]=[query["aggregate"]]
+        repairs.append("single_stage")
+
+    return query, repairs
+
 def parse_dynamic_datetime(val):
 
     now = datetime.datetime.now(datetime.timezone.utc)
@@ -0,0 +1,136 @@
+from pymongo import MongoClient, monitoring
+from redis import Redis, ConnectionPool
+from configs.settings import settings
+from helper.metrics import metrics
+import threading
+import time
+
+class CommandLatencyListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.observe("mongo_command_seconds", event.duration_micros/1_000_000,
+                        {"command": event.command_name, "database": event.database_name})
+
+    def failed(self, event):
+        metrics.observe("mongo_command_seconds", event.duration_micros/1_000_000,
+                        {"command": event.command_name, "database": event.database_name})
+        metrics.increment("mongo_command_failures_total", labels={"command": event.command_name})
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.started_at=threading.local()
+
+    def connection_check_out_started(self, event):
+        self.started_at.value=time.perf_counter()
+
+    def connection_checked_out(self, event):
+        # pymongo >= 4.7 reports the wait itself, older versions need the start timestamp
+        duration=getattr(event, "duration", None)
+        if duration is None:
+            started_at=getattr(self.started_at, "value", None)
+            duration=time.perf_counter()-started_at if started_at else 0.0
+        metrics.observe("mongo_pool_wait_seconds", duration)
+        metrics.adjust("mongo_pool_checked_out", 1, {"address": f"{event.address[0]}:{event.address[1]}"})
+
+    def connection_checked_in(self, event):
+        metrics.adjust("mongo_pool_checked_out", -1, {"address": f"{event.address[0]}:{event.address[1]}"})
+
+    def connection_check_out_failed(self, event):
+        metrics.increment("mongo_pool_checkout_failures_total", labels={"reason": str(event.reason)})
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+class InstrumentedRedis(Redis):
+    def execute_command(self, *args, **options):
+        start=time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            metrics.observe("redis_command_seconds", time.perf_counter()-start, {"command": str(args[0]).upper()})
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe=super().pipeline(transaction=transaction, shard_hint=shard_hint)
+        execute=pipe.execute
+
+        def timed_execute(raise_on_error=True):
+            start=time.perf_counter()
+            try:
+                return execute(raise_on_error=raise_on_error)
+            finally:
+                metrics.observe("redis_command_seconds", time.perf_counter()-start, {"command": "PIPELINE"})
+
+        pipe.execute=timed_execute
+        return pipe
+
+lock=threading.Lock()
+mongo_client=None
+redis_pools={}
+
+def get_mongo_client():
+    global mongo_client
+    if mongo_client is None:
+        with lock:
+            if mongo_client is None:
+                mongo_client=MongoClient(settings.atlas_connection_string,
+                                         maxPoolSize=settings.mongo_max_pool_size,
+                                         minPoolSize=settings.mongo_min_pool_size,
+                                         maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+                                         waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+                                         serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+                                         connectTimeoutMS=settings.mongo_connect_timeout_ms,
+                                         readPreference=settings.mongo_read_preference,
+                                         event_listeners=[CommandLatencyListener(), PoolWaitListener()])
+    return mongo_client
+
+def get_redis(decode_responses=True):
+    pool=redis_pools.get(decode_responses)
+    if pool is None:
+        with lock:
+            pool=redis_pools.get(decode_responses)
+            if pool is None:
+                pool=redis_pools[decode_responses]=ConnectionPool(
+                    host=settings.redis_host,port=settings.redis_port,db=0,
+                    username=settings.redis_username,password=settings.redis_password,
+                    decode_responses=decode_responses,
+                    max_connections=settings.redis_max_connections,
+                    socket_timeout=settings.redis_socket_timeout,
+                    socket_connect_timeout=settings.redis_socket_connect_timeout,
+                    health_check_interval=settings.redis_health_check_interval)
+    return InstrumentedRedis(connection_pool=pool)
+
+def pool_config():
+    return {
+        "mongo": {
+            "max_pool_size": settings.mongo_max_pool_size,
+            "min_pool_size": settings.mongo_min_pool_size,
+            "max_idle_time_ms": settings.mongo_max_idle_time_ms,
+            "wait_queue_timeout_ms": settings.mongo_wait_queue_timeout_ms,
+            "read_preference": settings.mongo_read_preference
+        },
+        "redis": {
+            "max_connections": settings.redis_max_connections,
+            "socket_timeout": settings.redis_socket_timeout,
+            "pools": sorted("text" if decode else "binary" for decode in redis_pools)
+        }
+    }
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import re
+
+# Chunk keys that carry no information for query generation
+DROP_KEYS = {"metadata"}
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    return len(text)//CHARS_PER_TOKEN+1
+
+def minify(text):
+    try:
+        obj=json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        return re.sub(r"\s+", " ", str(text)).strip()
+    if isinstance(obj, dict):
+        obj={key: value for key, value in obj.items() if key not in DROP_KEYS}
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def chunk_collection(metadata):
+    collection_name=metadata.get("collection_name")
+    return collection_name if isinstance(collection_name, str) else None
+
+def target_collection(chunks):
+    # Collection the question is most likely about, weighted by the retrieval scores
+    weights={}
+    for chunk in chunks:
+        if chunk["collection"] and chunk["chunk_type"]!="syntax_guideline":
+            weights[chunk["collection"]]=weights.get(chunk["collection"], 0.0)+chunk["score"]
+    if not weights:
+        for chunk in chunks:
+            if chunk["collection"]:
+                weights[chunk["collection"]]=weights.get(chunk["collection"], 0.0)+chunk["score"]
+    return max(weights, key=weights.get) if weights else None
+
+def build_context(docs, min_score=0.0, token_budget=1500, guideline_boost=0.05):
+    chunks=[]
+    seen=set()
+    for doc, score in docs:
+        content=minify(doc.page_content)
+        digest=doc.metadata.get("content_hash") or hashlib.sha1(content.encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        chunks.append({
+            "content": content,
+            "score": float(score),
+            "collection": chunk_collection(doc.metadata),
+            "chunk_type": doc.metadata.get("chunk_type")
+        })
+    if not chunks:
+        return []
+
+    best=max(chunks, key=lambda chunk: chunk["score"])
+    relevant=[chunk for chunk in chunks if chunk["score"]>=min_score] or [best]
+
+    target=target_collection(relevant)
+    def rank(chunk):
+        boosted=chunk["chunk_type"]=="syntax_guideline" and chunk["collection"]==target
+        return chunk["score"]+(guideline_boost if boosted else 0.0)
+    relevant.sort(key=rank, reverse=True)
+
+    context=[]
+    used=0
+    for chunk in relevant:
+        tokens=estimate_tokens(chunk["content"])
+        if context and used+tokens>token_budget:
+            continue
+        used+=tokens
+        context.append(chunk)
+    return context
+
+def render_context(context):
+    return "\n".join(f"- [{chunk.get('chunk_type') or 'chunk'}] {chunk['content']}" for chunk in context)
@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from configs.paths import GUIDELINE_LOG
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def guideline_hash(guideline):
+    key={"prompt": " ".join(str(guideline.get("prompt", "")).split()).lower(), "query": guideline.get("query")}
+    canonical=json.dumps(key, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def iter_lines(f):
+    # Yields (end_offset, entry) for complete lines, a torn last line from a crash is left for later
+    offset=f.tell()
+    for raw in f:
+        if not raw.endswith(b"\n"):
+            break
+        offset+=len(raw)
+        try:
+            yield offset, json.loads(raw)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            continue
+
+class GuidelineStore:
+    def __init__(self, path=GUIDELINE_LOG):
+        self.path=path
+        self.lock=threading.Lock()
+        self.hashes=set()
+        self.offset=0
+        self.inode=None
+
+    @contextmanager
+    def file_lock(self, f):
+        # Other workers append to the same file, flock keeps their appends and dedup checks in order
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def catch_up(self, f):
+        stat=os.fstat(f.fileno())
+        if stat.st_ino!=self.inode or stat.st_size<self.offset:
+            # Replaced by a compaction, read from the start
+            self.hashes=set()
+            self.offset=0
+            self.inode=stat.st_ino
+        f.seek(self.offset)
+        for offset, entry in iter_lines(f):
+            self.hashes.add(entry.get("content_hash") or guideline_hash(entry))
+            self.offset=offset
+
+    def append(self, guideline):
+        entry={**guideline, "content_hash": guideline_hash(guideline)}
+        line=(json.dumps(entry, ensure_ascii=False, separators=(",", ":"))+"\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            while True:
+                with open(self.path, "a+b") as f, self.file_lock(f):
+                    if os.fstat(f.fileno()).st_ino!=os.stat(self.path).st_ino:
+                        # A compaction replaced the file while we waited for the lock
+                        continue
+                    self.catch_up(f)
+                    if entry["content_hash"] in self.hashes:
+                        return False
+                    if self.offset<f.seek(0, os.SEEK_END):
+                        # Drop a torn line so the new entry starts on its own line
+                        f.truncate(self.offset)
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.offset+=len(line)
+                    self.hashes.add(entry["content_hash"])
+                    return True
+
+    def iter_entries(self, offset=0):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                yield from iter_lines(f)
+        except FileNotFoundError:
+            return
+
+    def compact(self):
+        if not self.path.exists():
+            return {"kept": 0, "dropped": 0}
+        tmp_path=self.path.with_suffix(self.path.suffix+".tmp")
+        with self.lock, open(self.path, "a+b") as f, self.file_lock(f):
+            f.seek(0)
+            seen=set()
+            kept=0
+            dropped=0
+            with open(tmp_path, "wb") as out:
+                for _, entry in iter_lines(f):
+                    entry["content_hash"]=entry.get("content_hash") or guideline_hash(entry)
+                    if entry["content_hash"] in seen:
+                        dropped+=1
+                        continue
+                    seen.add(entry["content_hash"])
+                    out.write((json.dumps(entry, ensure_ascii=False, separators=(",", ":"))+"\n").encode("utf-8"))
+                    kept+=1
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+        return {"kept": kept, "dropped": dropped}
+
+def main():
+    parser=argparse.ArgumentParser(description="Maintain the confirmed syntax guideline log")
+    parser.add_argument("--compact", action="store_true", help="Rewrite the log without duplicates and torn lines")
+    args=parser.parse_args()
+
+    store=GuidelineStore()
+    if args.compact:
+        print(json.dumps(store.compact()))
+    else:
+        print(json.dumps({"entries": sum(1 for _ in store.iter_entries())}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+import argparse
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from configs.settings import settings
+from helper.debug_state import convert_objectid
+from helper.query_guard import has_collscan
+from helper.connections import get_mongo_client
+from helper.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists"}
+# Stages after which $match/$sort no longer run against the collection's indexes
+BARRIER_STAGES = {"$group", "$project", "$unwind", "$lookup", "$addFields", "$set", "$unset",
+                  "$replaceRoot", "$facet", "$bucket", "$count", "$limit", "$skip"}
+
+def match_fields(match):
+    equality=[]
+    ranges=[]
+    for field, condition in match.items():
+        if field.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            ranges.append(field)
+        else:
+            equality.append(field)
+    return equality, ranges
+
+def extract_usage(collection_name, pipeline):
+    equality=[]
+    ranges=[]
+    sort=[]
+    usages=[]
+    for stage in pipeline:
+        name=next(iter(stage), None)
+        if name=="$match":
+            stage_equality, stage_ranges=match_fields(stage["$match"])
+            equality+=[field for field in stage_equality if field not in equality]
+            ranges+=[field for field in stage_ranges if field not in ranges]
+        elif name=="$sort":
+            sort+=[[field, direction] for field, direction in stage["$sort"].items()
+                   if isinstance(direction, int)]
+            break
+        elif name in BARRIER_STAGES:
+            break
+
+    if equality or ranges or sort:
+        usages.append({"collection": collection_name, "equality": equality, "sort": sort, "range": ranges})
+
+    for stage in pipeline:
+        lookup=stage.get("$lookup")
+        if isinstance(lookup, dict) and lookup.get("from") and lookup.get("foreignField"):
+            usages.append({"collection": lookup["from"], "equality": [lookup["foreignField"]],
+                           "sort": [], "range": []})
+    return usages
+
+def candidate_keys(usage):
+    # Equality, Sort, Range ordering for compound indexes
+    keys=[[field, 1] for field in usage["equality"]]
+    keys+=[[field, direction] for field, direction in usage["sort"] if field not in usage["equality"]]
+    used={field for field, _ in keys}
+    keys+=[[field, 1] for field in usage["range"] if field not in used]
+    return keys
+
+def is_covered(keys, indexes):
+    fields=[field for field, _ in keys]
+    for index in indexes.values():
+        index_fields=[field for field, _ in index["key"]]
+        if index_fields[:len(fields)]==fields:
+            return True
+    return False
+
+class IndexAdvisor:
+    def __init__(self, db, log_collection, queue_size=1000, flush_interval=5.0, flush_size=100):
+        self.db=db
+        self.log=log_collection
+        self.queue=queue.Queue(maxsize=queue_size)
+        self.flush_interval=flush_interval
+        self.flush_size=flush_size
+        self.lock=threading.Lock()
+        self.worker=None
+
+    def updates(self, collection_name, pipeline):
+        now=datetime.datetime.now(datetime.timezone.utc)
+        # Stored as a string because stage names are $-prefixed keys
+        sample=json.dumps(convert_objectid(pipeline), ensure_ascii=False)
+        for usage in extract_usage(collection_name, pipeline):
+            keys=candidate_keys(usage)
+            signature=",".join(f"{field}:{direction}" for field, direction in keys)
+            yield f"{usage['collection']}|{signature}", {
+                **usage, "keys": keys, "last_seen": now,
+                "sample_pipeline": sample if usage["collection"]==collection_name else None
+            }
+
+    def write(self, entries):
+        # entries maps _id to (fields, count), one upsert per distinct usage
+        if entries:
+            self.log.bulk_write([UpdateOne({"_id": key}, {"$set": fields, "$inc": {"count": count}}, upsert=True)
+                                 for key, (fields, count) in entries.items()], ordered=False)
+
+    def record(self, collection_name, pipeline):
+        self.write({key: (fields, 1) for key, fields in self.updates(collection_name, pipeline)})
+
+    def submit(self, collection_name, pipeline):
+        # Called on the request path, the upserts run later on the worker thread
+        with self.lock:
+            if self.worker is None:
+                self.worker=threading.Thread(target=self.run, name="index-advisor", daemon=True)
+                self.worker.start()
+        try:
+            self.queue.put_nowait((collection_name, pipeline))
+        except queue.Full:
+            metrics.increment("index_advisor_dropped_total")
+
+    def collect(self):
+        batch=[self.queue.get()]
+        deadline=time.monotonic()+self.flush_interval
+        while len(batch)<self.flush_size:
+            remaining=deadline-time.monotonic()
+            if remaining<=0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            entries={}
+            for collection_name, pipeline in self.collect():
+                for key, fields in self.updates(collection_name, pipeline):
+                    count=entries[key][1]+1 if key in entries else 1
+                    entries[key]=(fields, count)
+            try:
+                self.write(entries)
+            except Exception as e:
+                # The worker must outlive a failed flush, the next batch may go through
+                logger.warning("Cannot record queries for index advisor: %s", e)
+
+    def recommend(self, limit=20, explain=True):
+        indexes={}
+        recommendations=[]
+        for usage in self.log.find().sort("count", -1):
+            collection_name=usage["collection"]
+            if collection_name not in indexes:
+                indexes[collection_name]=self.db[collection_name].index_information()
+            if is_covered(usage["keys"], indexes[collection_name]):
+                continue
+
+            collscan=None
+            if explain and usage.get("sample_pipeline"):
+                try:
+                    collscan=has_collscan(self.db, collection_name, json.loads(usage["sample_pipeline"]))
+                except PyMongoError:
+                    collscan=None
+            if collscan is False:
+                continue
+
+            recommendations.append({
+                "collection": collection_name,
+                "keys": usage["keys"],
+                "count": usage["count"],
+                "collscan": collscan,
+                "last_seen": usage.get("last_seen")
+            })
+            if len(recommendations)>=limit:
+                break
+        return recommendations
+
+    def create(self, recommendations):
+        created=[]
+        for recommendation in recommendations:
+            keys=[(field, direction) for field, direction in recommendation["keys"]]
+            name=self.db[recommendation["collection"]].create_index(keys)
+            created.append({"collection": recommendation["collection"], "index": name})
+        return created
+
+def main():
+    parser=argparse.ArgumentParser(description="Recommend indexes from the queries Text2Query generated")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--no-explain", action="store_true", help="Do not confirm recommendations with explain")
+    parser.add_argument("--create", action="store_true", help="Create the recommended indexes")
+    args=parser.parse_args()
+
+    client=get_mongo_client()
+    advisor=IndexAdvisor(client[settings.atlas_db_name],
+                         client[settings.atlas_db_rag][settings.index_advisor_collection])
+    recommendations=advisor.recommend(limit=args.limit, explain=not args.no_explain)
+    print(json.dumps(recommendations, ensure_ascii=False, indent=2, default=str))
+    if args.create:
+        print(json.dumps(advisor.create(recommendations), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
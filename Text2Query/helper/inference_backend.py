@@ -0,0 +1,79 @@
+from transformers import AutoModelForSeq2SeqLM
+from sentence_transformers import SentenceTransformer
+from configs.settings import settings
+from configs.paths import MODEL_DIR
+from pathlib import Path
+import os
+import shutil
+import tempfile
+import torch
+
+BACKENDS = ("default", "int8", "onnx")
+
+def get_backend(backend=None):
+    backend=backend or settings.model_registry.get("inference_backend", "default")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    return backend
+
+def configure_threads():
+    threads=settings.model_registry.get("inference_threads")
+    if threads:
+        torch.set_num_threads(int(threads))
+
+def onnx_dir(model_path):
+    return MODEL_DIR/f"{Path(model_path).name}-onnx"
+
+def export_once(export_dir, export):
+    # Exporting takes minutes, do it on the first start only. The export goes to a temporary
+    # directory first so a crash or a second worker never leaves a half-written model behind
+    if export_dir.exists():
+        return
+    export_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir=Path(tempfile.mkdtemp(prefix=f".{export_dir.name}-", dir=export_dir.parent))
+    try:
+        export(tmp_dir)
+        os.replace(tmp_dir, export_dir)
+    except OSError:
+        if not export_dir.exists():
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def load_seq2seq(model_path, device, backend=None):
+    backend=get_backend(backend)
+    configure_threads()
+    if backend=="onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise ImportError("The onnx backend requires 'optimum[onnxruntime]'") from e
+        export_dir=onnx_dir(model_path)
+        export_once(export_dir, lambda tmp_dir: ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True)
+                    .save_pretrained(tmp_dir))
+        return ORTModelForSeq2SeqLM.from_pretrained(export_dir)
+
+    model=AutoModelForSeq2SeqLM.from_pretrained(model_path).eval()
+    if backend=="int8":
+        # Dynamic int8 quantization only runs on CPU
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model.to(device)
+
+def load_sentence_transformer(model_path, device, backend=None):
+    backend=get_backend(backend)
+    configure_threads()
+    if backend=="onnx":
+        export_dir=onnx_dir(model_path)
+        export_once(export_dir, lambda tmp_dir: SentenceTransformer(model_path, device="cpu", backend="onnx")
+                    .save_pretrained(str(tmp_dir)))
+        return SentenceTransformer(str(export_dir), device="cpu", backend="onnx")
+
+    if backend=="int8":
+        model=SentenceTransformer(model_path, device="cpu").eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(model_path, device=device)
+
+def resolve_device(backend=None):
+    if get_backend(backend)!="default":
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
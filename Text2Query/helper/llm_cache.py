@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from langchain_core.messages import AIMessage
+from helper.metrics import metrics
+import hashlib
+import threading
+import time
+
+def normalize_prompt(prompt):
+    # Prompts are indented f-strings, indentation changes must not split the cache
+    return "\n".join(" ".join(line.split()) for line in str(prompt).strip().splitlines() if line.strip())
+
+class InFlight:
+    def __init__(self):
+        self.done=threading.Event()
+        self.content=None
+        self.error=None
+
+class CachedLLM:
+    def __init__(self, llm, model="", redis=None, max_size=512, ttl=3600):
+        self.llm=llm
+        self.model=model
+        self.redis=redis
+        self.max_size=max_size
+        self.ttl=ttl
+        self.entries=OrderedDict()
+        self.in_flight={}
+        self.lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+        self.coalesced=0
+        self.invoke_seconds=0.0
+
+    def cache_key(self, prompt):
+        digest=hashlib.sha256(f"{self.model}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+        return f"llm:{digest}"
+
+    def get(self, key):
+        now=time.time()
+        with self.lock:
+            entry=self.entries.get(key)
+            if entry and entry[1]>now:
+                self.entries.move_to_end(key)
+                return entry[0]
+            self.entries.pop(key, None)
+        if self.redis is not None:
+            value=self.redis.get(key)
+            if value is not None:
+                self.set_local(key, value)
+                return value
+        return None
+
+    def set_local(self, key, value):
+        with self.lock:
+            self.entries[key]=(value, time.time()+self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.max_size:
+                self.entries.popitem(last=False)
+
+    def set(self, key, value):
+        self.set_local(key, value)
+        if self.redis is not None:
+            self.redis.setex(key, self.ttl, value)
+
+    def cached_message(self, content):
+        return AIMessage(content=content, response_metadata={"cached": True})
+
+    def record(self, result):
+        metrics.increment("llm_cache_lookups_total", labels={"result": result})
+        with self.lock:
+            avg_seconds=self.invoke_seconds/self.misses if self.misses else 0.0
+        if result!="miss" and avg_seconds:
+            metrics.increment("llm_cache_saved_seconds_total", avg_seconds)
+
+    def invoke(self, prompt):
+        key=self.cache_key(prompt)
+        cached=self.get(key)
+        if cached is not None:
+            with self.lock:
+                self.hits+=1
+            self.record("hit")
+            return self.cached_message(cached)
+
+        with self.lock:
+            flight=self.in_flight.get(key)
+            leader=flight is None
+            if leader:
+                flight=self.in_flight[key]=InFlight()
+            else:
+                self.coalesced+=1
+
+        if not leader:
+            # Same prompt already sent to the model, wait for that answer instead of paying twice
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self.record("coalesced")
+            return self.cached_message(flight.content)
+
+        try:
+            start=time.perf_counter()
+            response=self.llm.invoke(prompt)
+            elapsed=time.perf_counter()-start
+            with self.lock:
+                self.misses+=1
+                self.invoke_seconds+=elapsed
+            flight.content=response.content
+            if isinstance(response.content, str):
+                self.set(key, response.content)
+            self.record("miss")
+            return response
+        except Exception as e:
+            flight.error=e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            lookups=self.hits+self.misses+self.coalesced
+            avg_seconds=self.invoke_seconds/self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits+self.coalesced)/lookups if lookups else 0.0,
+                "size": len(self.entries),
+                "in_flight": len(self.in_flight),
+                "avg_invoke_seconds": avg_seconds,
+                "estimated_seconds_saved": avg_seconds*(self.hits+self.coalesced)
+            }
@@ -0,0 +1,99 @@
+import threading
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets=buckets
+        self.lock=threading.Lock()
+        self.histograms={}
+        self.counters={}
+        self.gauges={}
+
+    def key(self, name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def observe(self, name, seconds, labels=None):
+        key=self.key(name, labels)
+        with self.lock:
+            histogram=self.histograms.get(key)
+            if histogram is None:
+                histogram=self.histograms[key]={"count": 0, "sum": 0.0, "max": 0.0,
+                                                "buckets": [0]*len(self.buckets)}
+            histogram["count"]+=1
+            histogram["sum"]+=seconds
+            histogram["max"]=max(histogram["max"], seconds)
+            for idx, bound in enumerate(self.buckets):
+                if seconds<=bound:
+                    histogram["buckets"][idx]+=1
+                    break
+
+    def increment(self, name, value=1, labels=None):
+        key=self.key(name, labels)
+        with self.lock:
+            self.counters[key]=self.counters.get(key, 0)+value
+
+    def adjust(self, name, delta, labels=None):
+        key=self.key(name, labels)
+        with self.lock:
+            self.gauges[key]=self.gauges.get(key, 0)+delta
+
+    def snapshot(self):
+        with self.lock:
+            histograms=[]
+            for (name, labels), histogram in self.histograms.items():
+                histograms.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram["count"],
+                    "sum": histogram["sum"],
+                    "avg": histogram["sum"]/histogram["count"] if histogram["count"] else 0.0,
+                    "max": histogram["max"]
+                })
+            counters=[{"name": name, "labels": dict(labels), "value": value}
+                      for (name, labels), value in self.counters.items()]
+            gauges=[{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.gauges.items()]
+            return {"histograms": histograms, "counters": counters, "gauges": gauges}
+
+    def render_prometheus(self, extra_gauges=None):
+        lines=[]
+        with self.lock:
+            histograms=sorted(self.histograms.items())
+            counters=sorted(self.counters.items())
+            gauges=sorted(self.gauges.items())
+
+        typed=set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative=0
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                cumulative+=count
+                lines.append(f"{name}_bucket{format_labels(labels+(('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels+(('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+
+        for kind, items in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in items:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for name, value in sorted((extra_gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines)+"\n"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{"+",".join(f'{key}="{escape_label(value)}"' for key, value in labels)+"}"
+
+metrics=Metrics()
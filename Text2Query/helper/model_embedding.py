@@ -1,34 +1,65 @@
-from sentence_transformers import SentenceTransformer
 import torch
-from pymongo import MongoClient 
+from pymongo.errors import PyMongoError
 from langchain_mongodb import MongoDBAtlasVectorSearch
+from langchain.schema import Document
 from configs.settings import settings
 from configs.paths import MODEL_DIR
+from helper.batch_scheduler import MicroBatcher
+from helper.connections import get_mongo_client
+from helper.metrics import metrics
+from helper.inference_backend import load_sentence_transformer, resolve_device
+import numpy as np
+from contextlib import contextmanager
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import json
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 class GemmEmbedding():
-    def __init__(self):
-        self.device="cuda" if torch.cuda.is_available() else "cpu"
-        self.model=SentenceTransformer(str(MODEL_DIR/settings.model_registry["embedder"]),
-                                       device=self.device)
+    def __init__(self, batching=False, backend=None):
+        self.device=resolve_device(backend)
+        self.model=load_sentence_transformer(str(MODEL_DIR/settings.model_registry["embedder"]),
+                                             self.device, backend)
+        self.batcher=None
+        if batching:
+            self.batcher=MicroBatcher(lambda _, texts: self.embed_documets(texts),
+                                      max_batch_size=settings.inference_max_batch_size,
+                                      max_wait_ms=settings.inference_max_wait_ms,
+                                      name="embedder-batcher")
         
-    def embedding(self,data):
-        embedding=self.model.encode(data, convert_to_numpy=True,device=self.device)
+    def embedding(self,data,batch_size=32):
+        with torch.inference_mode():
+            embedding=self.model.encode(data, batch_size=batch_size, convert_to_numpy=True,device=self.device)
         return embedding
     
     def embed_query(self,text):
-        embedding=self.model.encode([text],convert_to_numpy=True,device=self.device)
+        if self.batcher:
+            return self.batcher.call(None, text)
+        with torch.inference_mode():
+            embedding=self.model.encode([text],convert_to_numpy=True,device=self.device)
         return embedding[0].tolist()
     
     def embed_documets(self,texts):
-        embeddings=self.model.encode(texts,convert_to_numpy=True,device=self.device)
+        with torch.inference_mode():
+            embeddings=self.model.encode(texts,convert_to_numpy=True,device=self.device)
         return embeddings.tolist()
 
 class VectorSearch:
-    def __init__(self):
-        self.client=MongoClient(settings.atlas_connection_string)
+    def __init__(self, embedder=None):
+        self.client=get_mongo_client()
         self.db=self.client[settings.atlas_db_rag]
         self.collection=self.db[settings.atlas_collection_rag]
-        self.embedder=GemmEmbedding()
+        self.embedder=embedder or GemmEmbedding(batching=settings.inference_batching)
         self.index_name=settings.index_name    
     
         self.vector_store=MongoDBAtlasVectorSearch(
@@ -38,5 +69,174 @@ class VectorSearch:
         )
      
     def search_with_score(self, prompt, top_k=5):
-        return self.vector_store.similarity_search_with_score(prompt, k=top_k)
-        
\ No newline at end of file
+        start=time.perf_counter()
+        try:
+            return self.vector_store.similarity_search_with_score(prompt, k=top_k)
+        finally:
+            metrics.observe("vector_search_seconds", time.perf_counter()-start, {"backend": "atlas"})
+
+class LocalVectorSearch:
+    def __init__(self, embedder=None):
+        self.client=get_mongo_client()
+        self.db=self.client[settings.atlas_db_rag]
+        self.collection=self.db[settings.atlas_collection_rag]
+        self.embedder=embedder or GemmEmbedding(batching=settings.inference_batching)
+        self.snapshot_dir=MODEL_DIR/settings.local_index_dir
+        self.refresh_interval=settings.local_index_refresh_interval
+
+        self.lock=threading.Lock()
+        self.matrix=np.empty((0, 0), dtype=np.float32)
+        self.docs=[]
+        self.fingerprint=None
+        self.load()
+        # Refreshing reads the whole collection, keep it off the request path
+        self.stopped=threading.Event()
+        self.refresher=threading.Thread(target=self.run_refresh, name="local-vector-refresh", daemon=True)
+        self.refresher.start()
+
+    def collection_fingerprint(self):
+        hashes=sorted(str(doc.get("content_hash", doc["_id"]))
+                      for doc in self.collection.find({}, {"content_hash": 1}))
+        return hashlib.sha256("|".join(hashes).encode("utf-8")).hexdigest()
+
+    def load(self):
+        try:
+            self.reload(self.collection_fingerprint())
+        except PyMongoError as e:
+            if not self.load_snapshot():
+                raise
+            logger.warning("Mongo unavailable, serving local vector index snapshot: %s", e)
+
+    def reload(self, fingerprint):
+        docs=[]
+        vectors=[]
+        for doc in self.collection.find({}, {"text": 1, "embedding": 1, "collection_name": 1,
+                                             "chunk_type": 1, "source": 1, "metadata": 1}):
+            if not doc.get("embedding"):
+                continue
+            vectors.append(doc.pop("embedding"))
+            doc["_id"]=str(doc["_id"])
+            docs.append(doc)
+
+        matrix=self.normalize(np.asarray(vectors, dtype=np.float32)) if vectors else np.empty((0, 0), dtype=np.float32)
+        with self.lock:
+            self.matrix=matrix
+            self.docs=docs
+            self.fingerprint=fingerprint
+        self.save_snapshot(matrix, docs, fingerprint)
+
+    def save_snapshot(self, matrix, docs, fingerprint):
+        # The matrix file is named after the fingerprint and documents.json, replaced last, points to it,
+        # so a reader never pairs new documents with an old matrix or a half-written file
+        try:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            matrix_name=f"embeddings-{fingerprint[:16]}.npy"
+            with self.snapshot_lock():
+                # Every worker saves on startup, the lock keeps one worker's cleanup away from another's files
+                self.write_atomic(matrix_name, lambda f: np.save(f, matrix))
+                self.write_atomic("documents.json", lambda f: f.write(json.dumps(
+                    {"fingerprint": fingerprint, "matrix": matrix_name, "documents": docs},
+                    ensure_ascii=False, default=str).encode("utf-8")))
+                for path in self.snapshot_dir.glob("embeddings*.npy"):
+                    if path.name!=matrix_name:
+                        path.unlink(missing_ok=True)
+        except OSError as e:
+            # The snapshot is only a fallback, the index in memory is already up to date
+            logger.warning("Cannot save local vector index snapshot: %s", e)
+
+    @contextmanager
+    def snapshot_lock(self):
+        with open(self.snapshot_dir/".lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def write_atomic(self, name, write):
+        fd, tmp_path=tempfile.mkstemp(prefix=f".{name}-", suffix=".tmp", dir=self.snapshot_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_dir/name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load_snapshot(self):
+        docs_path=self.snapshot_dir/"documents.json"
+        if not docs_path.exists():
+            return False
+        with open(docs_path, "r", encoding="utf-8") as f:
+            snapshot=json.load(f)
+        matrix_path=self.snapshot_dir/snapshot.get("matrix", "embeddings.npy")
+        if not matrix_path.exists():
+            return False
+        matrix=np.load(matrix_path, mmap_mode="r" if settings.local_index_mmap else None)
+        if len(matrix)!=len(snapshot["documents"]):
+            logger.warning("Local vector index snapshot is inconsistent, ignoring it")
+            return False
+        with self.lock:
+            self.matrix=matrix
+            self.docs=snapshot["documents"]
+            self.fingerprint=snapshot["fingerprint"]
+        return True
+
+    def refresh(self):
+        try:
+            fingerprint=self.collection_fingerprint()
+            if fingerprint!=self.fingerprint:
+                self.reload(fingerprint)
+        except PyMongoError as e:
+            logger.warning("Cannot refresh local vector index, keep current snapshot: %s", e)
+
+    def run_refresh(self):
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Local vector index refresh failed")
+
+    def close(self):
+        self.stopped.set()
+
+    def normalize(self, vectors):
+        norms=np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms==0]=1.0
+        return vectors/norms
+
+    def search_by_vector(self, vector, top_k=5):
+        start=time.perf_counter()
+        try:
+            return self.top_k(vector, top_k)
+        finally:
+            metrics.observe("vector_search_seconds", time.perf_counter()-start, {"backend": "local"})
+
+    def top_k(self, vector, top_k):
+        with self.lock:
+            matrix=self.matrix
+            docs=self.docs
+        if not docs:
+            return []
+
+        query=self.normalize(np.asarray(vector, dtype=np.float32))
+        scores=matrix@query
+        k=min(top_k, len(docs))
+        top=np.argpartition(-scores, k-1)[:k]
+        top=top[np.argsort(-scores[top])]
+
+        results=[]
+        for idx in top:
+            doc=docs[idx]
+            metadata={key: value for key, value in doc.items() if key!="text"}
+            # Same (1 + cosine) / 2 scale as Atlas Vector Search cosine scores
+            results.append((Document(page_content=doc.get("text", ""), metadata=metadata),
+                            float((1+scores[idx])/2)))
+        return results
+
+    def search_with_score(self, prompt, top_k=5):
+        return self.search_by_vector(self.embedder.embed_query(prompt), top_k=top_k)
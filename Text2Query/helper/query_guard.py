@@ -0,0 +1,113 @@
+from pymongo.errors import PyMongoError
+import threading
+import time
+
+WRITE_STAGES = ("$out", "$merge")
+LIMITING_STAGES = ("$limit", "$count")
+
+def find_stages(pipeline, name):
+    return [idx for idx, stage in enumerate(pipeline) if name in stage]
+
+def iter_plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from iter_plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from iter_plan_stages(item)
+
+def has_collscan(db, collection_name, pipeline):
+    explain=db.command("explain", {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}},
+                       verbosity="queryPlanner")
+    return "COLLSCAN" in set(iter_plan_stages(explain))
+
+def unwind_path(stage):
+    unwind=stage["$unwind"]
+    return unwind.get("path") if isinstance(unwind, dict) else unwind
+
+def unbounded_lookups(pipeline):
+    lookups=[]
+    for idx in find_stages(pipeline, "$lookup"):
+        lookup=pipeline[idx]["$lookup"]
+        sub_pipeline=lookup.get("pipeline") or []
+        if any("$limit" in stage for stage in sub_pipeline if isinstance(stage, dict)):
+            continue
+        as_path=f"${lookup.get('as')}"
+        unwound=any(unwind_path(stage)==as_path for stage in pipeline[idx+1:] if "$unwind" in stage)
+        lookups.append({"stage": idx, "from": lookup.get("from"), "unwound": unwound})
+    return lookups
+
+class QueryGuard:
+    def __init__(self, policy="limit", max_documents=1000, max_time_ms=10000, allow_disk_use=False,
+                 max_lookups=3, collscan_threshold=10000, use_explain=True, count_ttl=300):
+        self.policy=policy
+        self.max_documents=max_documents
+        self.max_time_ms=max_time_ms
+        self.allow_disk_use=allow_disk_use
+        self.max_lookups=max_lookups
+        self.collscan_threshold=collscan_threshold
+        self.use_explain=use_explain
+        self.count_ttl=count_ttl
+        self.counts={}
+        self.lock=threading.Lock()
+
+    def document_count(self, db, collection_name):
+        # Only compared against collscan_threshold, a few minutes old count is close enough
+        now=time.monotonic()
+        with self.lock:
+            cached=self.counts.get(collection_name)
+        if cached and now-cached[1]<self.count_ttl:
+            return cached[0]
+        count=db[collection_name].estimated_document_count()
+        with self.lock:
+            self.counts[collection_name]=(count, now)
+        return count
+
+    def stream_limit(self):
+        # Under the limit policy a full read of the results stops at max_documents
+        return self.max_documents if self.policy=="limit" else None
+
+    def check(self, db, collection_name, pipeline):
+        pipeline=list(pipeline)
+        errors=[]
+        risks=[]
+        warnings=[]
+        options={"maxTimeMS": self.max_time_ms, "allowDiskUse": self.allow_disk_use}
+
+        if self.policy=="off":
+            return pipeline, options, errors, warnings
+
+        for name in WRITE_STAGES:
+            if find_stages(pipeline, name):
+                errors.append(f"Stage {name} writes to the database and is not allowed.")
+        if errors:
+            return pipeline, options, errors, warnings
+
+        lookups=unbounded_lookups(pipeline)
+        if len(lookups)>self.max_lookups:
+            risks.append(f"Pipeline has {len(lookups)} unbounded $lookup stages (max {self.max_lookups}).")
+        fan_out=[str(lookup["from"]) for lookup in lookups if lookup["unwound"]]
+        if fan_out:
+            risks.append(f"$unwind after unbounded $lookup on {', '.join(fan_out)} may multiply documents.")
+
+        if self.use_explain:
+            try:
+                if self.document_count(db, collection_name)>=self.collscan_threshold \
+                        and has_collscan(db, collection_name, pipeline):
+                    risks.append(f"Pipeline scans the whole '{collection_name}' collection (COLLSCAN); "
+                                 f"add a $match on an indexed field.")
+            except PyMongoError as e:
+                warnings.append(f"Cannot explain pipeline: {e}")
+
+        # The saved pipeline stays unbounded so /results can page past any cap, the preview and
+        # every page add their own $limit and stream_limit caps a full read
+        if self.policy=="reject" and not any(name in stage for stage in pipeline for name in LIMITING_STAGES):
+            risks.append(f"Pipeline has no $limit; add one of at most {self.max_documents} documents.")
+
+        if self.policy=="reject":
+            errors.extend(risks)
+        else:
+            warnings.extend(risks)
+        return pipeline, options, errors, warnings
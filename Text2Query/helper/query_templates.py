@@ -0,0 +1,183 @@
+import copy
+import json
+import re
+
+# Relative dates in a (translated) prompt and the __datetime__ token they are stored as
+DATE_PHRASES = [
+    (re.compile(r"(?:last|past) (\d+) days?|(\d+) days? ago", re.IGNORECASE), "{}_DAYS_AGO"),
+    (re.compile(r"(?:last|past) (\d+) hours?|(\d+) hours? ago", re.IGNORECASE), "{}_HOURS_AGO"),
+    (re.compile(r"next (\d+) days?|in (\d+) days?", re.IGNORECASE), "IN_{}_DAYS"),
+    (re.compile(r"next (\d+) hours?|in (\d+) hours?", re.IGNORECASE), "IN_{}_HOURS"),
+]
+QUOTED = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+NUMBER = re.compile(r"(?<![\w.])(\d+)(?![\w.])")
+WORD = re.compile(r"[\w-]+", re.UNICODE)
+TRAILING = re.compile(r"[\s.?!]+$")
+MAX_SLOT_LENGTH = 80
+# What each kind of slot may capture, anything else (a clause, a negation, ...) needs the LLM
+SLOT_PATTERNS = {
+    "date": r"(\d+)",
+    "number": r"(\d+)",
+    "quoted": r"([^'\"]+)",
+    "name": r"([\w-]+(?: [\w-]+)*)",
+}
+
+# Only literals that select documents can be slots, never arguments such as $sum, $sort, $project or $limit
+NESTED_PIPELINES = {"$lookup": "pipeline", "$unionWith": "pipeline"}
+SKIP_KEYS = {"$options"}
+
+def iter_leaves(value, path):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in SKIP_KEYS:
+                yield from iter_leaves(item, path+(key,))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from iter_leaves(item, path+(index,))
+    elif isinstance(value, str) and value.startswith("$"):
+        # Field path, not a literal
+        return
+    else:
+        yield path, value
+
+def iter_stage_literals(stages, path):
+    for index, stage in enumerate(stages):
+        if not isinstance(stage, dict):
+            continue
+        for name, spec in stage.items():
+            stage_path=path+(index, name)
+            if name=="$match":
+                yield from iter_leaves(spec, stage_path)
+            elif name in NESTED_PIPELINES and isinstance(spec, dict) and isinstance(spec.get(NESTED_PIPELINES[name]), list):
+                yield from iter_stage_literals(spec[NESTED_PIPELINES[name]], stage_path+(NESTED_PIPELINES[name],))
+            elif name=="$facet" and isinstance(spec, dict):
+                for facet, pipeline in spec.items():
+                    if isinstance(pipeline, list):
+                        yield from iter_stage_literals(pipeline, stage_path+(facet,))
+
+def query_literals(query):
+    aggregate=query.get("aggregate")
+    return list(iter_stage_literals(aggregate, ("aggregate",))) if isinstance(aggregate, list) else []
+
+def capitalized_runs(prompt):
+    # Runs of capitalized words such as Soctrip Travel or Bảo, usually names
+    runs=[]
+    for match in WORD.finditer(prompt):
+        if not match.group()[0].isupper():
+            continue
+        if runs and prompt[runs[-1][1]:match.start()]==" ":
+            runs[-1][1]=match.end()
+        else:
+            runs.append([match.start(), match.end()])
+    return runs
+
+def prompt_literals(prompt):
+    # Names, quoted values and numbers of a prompt, questions that differ only in these need different queries
+    prompt=TRAILING.sub("", prompt.strip())
+    literals=[match.group(1) or match.group(2) for match in QUOTED.finditer(prompt)]
+    literals+=[prompt[start:end] for start, end in capitalized_runs(prompt) if start>0]
+    literals+=[match.group(1) for match in NUMBER.finditer(prompt)]
+    return sorted({literal.casefold() for literal in literals})
+
+def find_slots(prompt, query):
+    # A slot is a part of the guideline prompt that also shows up as a literal in its query,
+    # each slot keeps the paths of those literals so filling never touches anything else
+    literals=query_literals(query)
+    strings=[(path, value) for path, value in literals if isinstance(value, str)]
+    numbers=[(path, value) for path, value in literals
+             if isinstance(value, int) and not isinstance(value, bool)]
+    slots=[]
+    taken=[False]*len(prompt)
+
+    def claim(start, end, kind, value, paths, token=None):
+        if not paths or any(taken[start:end]):
+            return
+        taken[start:end]=[True]*(end-start)
+        slots.append({"start": start, "end": end, "kind": kind, "value": value, "token": token, "paths": paths})
+
+    for pattern, token in DATE_PHRASES:
+        for match in pattern.finditer(prompt):
+            group=1 if match.group(1) else 2
+            stored=token.format(match.group(group))
+            paths=[path for path, string in strings if path[-1]=="__datetime__" and string==stored]
+            claim(match.start(group), match.end(group), "date", match.group(group), paths, token)
+
+    for match in QUOTED.finditer(prompt):
+        group=1 if match.group(1) else 2
+        value=match.group(group)
+        claim(match.start(group), match.end(group), "quoted", value,
+              [path for path, string in strings if value in string])
+
+    for start, end in capitalized_runs(prompt):
+        value=prompt[start:end]
+        if start>0:
+            claim(start, end, "name", value, [path for path, string in strings if value in string])
+
+    for match in NUMBER.finditer(prompt):
+        value=int(match.group(1))
+        claim(match.start(1), match.end(1), "number", match.group(1),
+              [path for path, number in numbers if number==value])
+    return sorted(slots, key=lambda slot: slot["start"])
+
+def build_pattern(prompt, slots):
+    parts=[]
+    position=0
+    for slot in slots:
+        parts.append(literal_pattern(prompt[position:slot["start"]]))
+        parts.append(SLOT_PATTERNS[slot["kind"]])
+        position=slot["end"]
+    parts.append(literal_pattern(prompt[position:]))
+    return re.compile("^"+"".join(parts)+"$", re.IGNORECASE)
+
+def literal_pattern(text):
+    return r"\s+".join(re.escape(word) for word in re.split(r"\s+", text)) if text.strip() else \
+        (r"\s+" if text else "")
+
+def fill(query, slots, values):
+    for slot, value in zip(slots, values):
+        for path in slot["paths"]:
+            parent=query
+            for key in path[:-1]:
+                parent=parent[key]
+            key=path[-1]
+            if slot["kind"]=="date":
+                parent[key]=slot["token"].format(value)
+            elif slot["kind"]=="number":
+                parent[key]=int(value)
+            elif value!=slot["value"]:
+                parent[key]=parent[key].replace(slot["value"], re.escape(value) if key=="$regex" else value)
+    return query
+
+def instantiate(prompt, guideline_prompt, guideline_query):
+    prompt=TRAILING.sub("", prompt.strip())
+    guideline_prompt=TRAILING.sub("", guideline_prompt.strip())
+    slots=find_slots(guideline_prompt, guideline_query)
+    match=build_pattern(guideline_prompt, slots).match(prompt)
+    if not match:
+        return None
+
+    values=[value.strip() for value in match.groups()]
+    if any(not value or len(value)>MAX_SLOT_LENGTH for value in values):
+        return None
+    # A name slot takes exactly one run of capitalized words, not "anyone except Minh"
+    if any(slot["kind"]=="name" and capitalized_runs(value)!=[[0, len(value)]] for slot, value in zip(slots, values)):
+        return None
+    return fill(copy.deepcopy(guideline_query), slots, values)
+
+def match_guidelines(prompt, context, min_score):
+    # Context chunks are sorted by relevance, the first guideline that fits wins
+    for chunk in sorted(context, key=lambda chunk: chunk["score"], reverse=True):
+        if chunk.get("chunk_type")!="syntax_guideline" or chunk["score"]<min_score:
+            continue
+        try:
+            guideline=json.loads(chunk["content"])
+        except (TypeError, json.JSONDecodeError):
+            continue
+        query=guideline.get("query")
+        if not isinstance(query, dict) or not isinstance(query.get("aggregate"), list) \
+                or not isinstance(guideline.get("prompt"), str):
+            continue
+        instantiated=instantiate(prompt, guideline["prompt"], query)
+        if instantiated is not None:
+            return instantiated, chunk["score"]
+    return None, None
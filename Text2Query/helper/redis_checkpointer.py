@@ -0,0 +1,191 @@
+from langgraph.checkpoint.base import (BaseCheckpointSaver, CheckpointTuple, WRITES_IDX_MAP,
+                                       get_checkpoint_id)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+import asyncio
+import json
+import time
+import zlib
+
+class CompressedSerializer:
+    def __init__(self, serde=None, level=6):
+        self.serde=serde or JsonPlusSerializer()
+        self.level=level
+
+    def dumps_typed(self, obj):
+        type_, data=self.serde.dumps_typed(obj)
+        return f"{type_}+zlib", zlib.compress(data, self.level)
+
+    def loads_typed(self, data):
+        type_, payload=data
+        if type_.endswith("+zlib"):
+            return self.serde.loads_typed((type_[:-len("+zlib")], zlib.decompress(payload)))
+        return self.serde.loads_typed(data)
+
+def pack(typed):
+    type_, data=typed
+    return type_.encode("utf-8")+b"\0"+data
+
+def unpack(raw):
+    type_, data=raw.split(b"\0", 1)
+    return type_.decode("utf-8"), data
+
+class RedisCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, redis, ttl=3600, keep_last=3, prefix="checkpoint"):
+        super().__init__(serde=CompressedSerializer())
+        # Needs a client created with decode_responses=False, payloads are binary
+        self.redis=redis
+        self.ttl=ttl
+        self.keep_last=max(keep_last, 2)
+        self.prefix=prefix
+
+    def index_key(self, thread_id, checkpoint_ns):
+        return f"{self.prefix}:index:{thread_id}:{checkpoint_ns}"
+
+    def checkpoint_key(self, thread_id, checkpoint_ns, checkpoint_id):
+        return f"{self.prefix}:data:{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    def writes_key(self, thread_id, checkpoint_ns, checkpoint_id):
+        return f"{self.prefix}:writes:{thread_id}:{checkpoint_ns}:{checkpoint_id}"
+
+    def threads_key(self, thread_id):
+        return f"{self.prefix}:namespaces:{thread_id}"
+
+    def load_tuple(self, thread_id, checkpoint_ns, checkpoint_id):
+        data=self.redis.hgetall(self.checkpoint_key(thread_id, checkpoint_ns, checkpoint_id))
+        if not data:
+            return None
+
+        pending_writes=[]
+        writes=self.redis.hgetall(self.writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        for field, value in sorted(writes.items(), key=lambda item: json.loads(item[0])[:2]):
+            task_id, _, channel, _=json.loads(field)
+            pending_writes.append((task_id, channel, self.serde.loads_typed(unpack(value))))
+
+        parent_id=data.get(b"parent_id", b"").decode("utf-8")
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed(unpack(data[b"checkpoint"])),
+            metadata=self.serde.loads_typed(unpack(data[b"metadata"])),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                            "checkpoint_id": parent_id}} if parent_id else None,
+            pending_writes=pending_writes
+        )
+
+    def get_tuple(self, config):
+        thread_id=config["configurable"]["thread_id"]
+        checkpoint_ns=config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id=get_checkpoint_id(config)
+        if not checkpoint_id:
+            latest=self.redis.zrevrange(self.index_key(thread_id, checkpoint_ns), 0, 0)
+            if not latest:
+                return None
+            checkpoint_id=latest[0].decode("utf-8")
+        return self.load_tuple(thread_id, checkpoint_ns, checkpoint_id)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config is None:
+            return
+        thread_id=config["configurable"]["thread_id"]
+        checkpoint_ns=config["configurable"].get("checkpoint_ns", "")
+        before_id=get_checkpoint_id(before) if before else None
+
+        count=0
+        for raw_id in self.redis.zrevrange(self.index_key(thread_id, checkpoint_ns), 0, -1):
+            checkpoint_id=raw_id.decode("utf-8")
+            if before_id and checkpoint_id>=before_id:
+                continue
+            checkpoint_tuple=self.load_tuple(thread_id, checkpoint_ns, checkpoint_id)
+            if checkpoint_tuple is None:
+                continue
+            if filter and any(checkpoint_tuple.metadata.get(key)!=value for key, value in filter.items()):
+                continue
+            yield checkpoint_tuple
+            count+=1
+            if limit is not None and count>=limit:
+                return
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id=config["configurable"]["thread_id"]
+        checkpoint_ns=config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id=checkpoint["id"]
+        index_key=self.index_key(thread_id, checkpoint_ns)
+        checkpoint_key=self.checkpoint_key(thread_id, checkpoint_ns, checkpoint_id)
+
+        pipe=self.redis.pipeline()
+        pipe.hset(checkpoint_key, mapping={
+            "checkpoint": pack(self.serde.dumps_typed(checkpoint)),
+            "metadata": pack(self.serde.dumps_typed(metadata)),
+            "parent_id": config["configurable"].get("checkpoint_id") or ""
+        })
+        pipe.expire(checkpoint_key, self.ttl)
+        pipe.zadd(index_key, {checkpoint_id: time.time()})
+        pipe.expire(index_key, self.ttl)
+        pipe.sadd(self.threads_key(thread_id), checkpoint_ns)
+        pipe.expire(self.threads_key(thread_id), self.ttl)
+        pipe.execute()
+
+        self.prune(thread_id, checkpoint_ns)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint_id}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id=config["configurable"]["thread_id"]
+        checkpoint_ns=config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id=config["configurable"]["checkpoint_id"]
+        writes_key=self.writes_key(thread_id, checkpoint_ns, checkpoint_id)
+
+        pipe=self.redis.pipeline()
+        for idx, (channel, value) in enumerate(writes):
+            write_idx=WRITES_IDX_MAP.get(channel, idx)
+            field=json.dumps([task_id, write_idx, channel, task_path])
+            payload=pack(self.serde.dumps_typed(value))
+            if write_idx>=0:
+                pipe.hsetnx(writes_key, field, payload)
+            else:
+                pipe.hset(writes_key, field, payload)
+        pipe.expire(writes_key, self.ttl)
+        pipe.execute()
+
+    def prune(self, thread_id, checkpoint_ns):
+        index_key=self.index_key(thread_id, checkpoint_ns)
+        stale=self.redis.zrange(index_key, 0, -(self.keep_last+1))
+        if not stale:
+            return
+        pipe=self.redis.pipeline()
+        for raw_id in stale:
+            checkpoint_id=raw_id.decode("utf-8")
+            pipe.delete(self.checkpoint_key(thread_id, checkpoint_ns, checkpoint_id),
+                        self.writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        pipe.zrem(index_key, *stale)
+        pipe.execute()
+
+    def delete_thread(self, thread_id):
+        for raw_ns in self.redis.smembers(self.threads_key(thread_id)):
+            checkpoint_ns=raw_ns.decode("utf-8")
+            index_key=self.index_key(thread_id, checkpoint_ns)
+            keys=[index_key]
+            for raw_id in self.redis.zrange(index_key, 0, -1):
+                checkpoint_id=raw_id.decode("utf-8")
+                keys+=[self.checkpoint_key(thread_id, checkpoint_ns, checkpoint_id),
+                       self.writes_key(thread_id, checkpoint_ns, checkpoint_id)]
+            self.redis.delete(*keys)
+        self.redis.delete(self.threads_key(thread_id))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoint_tuples=await asyncio.to_thread(lambda: list(self.list(config, filter=filter,
+                                                                          before=before, limit=limit)))
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,133 @@
+from helper.debug_state import convert_objectid
+from bson import json_util
+from bson.errors import InvalidBSON
+from itertools import islice
+import base64
+import json
+
+# Stages after which the output order is no longer the order of an earlier $sort
+REGROUPING_STAGES = ("$group", "$bucket", "$bucketAuto", "$sortByCount", "$facet")
+# Stages whose output _id is unique again
+GROUPING_STAGES = ("$group", "$bucket", "$bucketAuto", "$sortByCount")
+# Stages whose output fields cannot be known from the pipeline alone
+OPAQUE_STAGES = ("$replaceRoot", "$replaceWith", "$count", "$facet")
+# Stages that can repeat or drop _id, paging by _id would skip documents
+KEYSET_UNSAFE_STAGES = ("$unwind", "$replaceRoot", "$replaceWith", "$unionWith", "$facet", "$sample")
+
+def encode_page_token(position):
+    # json_util keeps the type of _id (ObjectId, date, ...) for the next $gt
+    raw=json_util.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_page_token(token):
+    if not token:
+        return {"offset": 0}
+    try:
+        position=json_util.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, TypeError, InvalidBSON) as e:
+        raise ValueError(f"Invalid page token: {token}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid page token: {token}")
+    if "after" in position:
+        return {"after": position["after"]}
+    offset=position.get("offset")
+    if not isinstance(offset, int) or offset<0:
+        raise ValueError(f"Invalid page token: {token}")
+    return {"offset": offset}
+
+def output_key(pipeline):
+    # What makes an output document unique: ["_id"] while the documents keep a unique _id,
+    # the output fields once a $project drops _id, None when neither is known
+    key=["_id"]
+    for stage in pipeline:
+        name=next(iter(stage), None)
+        spec=stage.get(name)
+        if name in GROUPING_STAGES:
+            key=["_id"]
+        elif name in OPAQUE_STAGES:
+            key=None
+        elif name=="$project" and isinstance(spec, dict):
+            if spec.get("_id") in (0, False):
+                fields=[field for field, value in spec.items() if field!="_id" and value not in (0, False)]
+                # An exclusion-only projection keeps fields we cannot name
+                key=fields or None
+            elif "_id" in spec and spec["_id"] not in (1, True):
+                key=None
+        elif name in ("$addFields", "$set") and isinstance(spec, dict):
+            if "_id" in spec:
+                key=None
+            elif key and key!=["_id"]:
+                key=key+[field for field in spec if field not in key]
+        elif name=="$unset":
+            if "_id" in ([spec] if isinstance(spec, str) else spec):
+                key=None
+        elif name=="$lookup" and key and key!=["_id"] and isinstance(spec, dict):
+            key=key+[spec.get("as")]
+    return key
+
+def order_pipeline(pipeline):
+    # Pages are only stable under a total order, so ties are broken by _id, or by every projected
+    # field when _id was dropped. Returns the ordered pipeline and how to page it: "keyset" by the
+    # last _id, "offset" with $skip, or None when no total order exists and only one page is served
+    pipeline=list(pipeline)
+    sorts=[idx for idx, stage in enumerate(pipeline) if "$sort" in stage]
+    if sorts and not any(name in stage for stage in pipeline[sorts[-1]+1:] for name in REGROUPING_STAGES):
+        key=output_key(pipeline[:sorts[-1]])
+        if key is None:
+            return pipeline, None
+        spec=pipeline[sorts[-1]]["$sort"]
+        pipeline[sorts[-1]]={"$sort": {**spec, **{field: 1 for field in key if field not in spec}}}
+        return pipeline, "offset"
+
+    key=output_key(pipeline)
+    if key is None:
+        return pipeline, None
+    if key!=["_id"]:
+        return pipeline+[{"$sort": {field: 1 for field in key}}], "offset"
+    keyset=not any(name in stage for stage in pipeline for name in KEYSET_UNSAFE_STAGES)
+    return pipeline+[{"$sort": {"_id": 1}}], "keyset" if keyset else "offset"
+
+def next_position(mode, position, documents):
+    if mode=="keyset":
+        return {"after": documents[-1]["_id"]} if "_id" in documents[-1] else None
+    if mode=="offset":
+        return {"offset": position.get("offset", 0)+len(documents)}
+    return None
+
+def fetch_page(collection, pipeline, position, page_size, **options):
+    ordered,mode=order_pipeline(pipeline)
+    if ("after" in position and mode!="keyset") or (position.get("offset") and mode is None):
+        raise ValueError("Page token does not fit this query")
+    if "after" in position:
+        paged_pipeline=ordered+[{"$match": {"_id": {"$gt": position["after"]}}}]
+    else:
+        paged_pipeline=ordered+([{"$skip": position["offset"]}] if position["offset"] else [])
+    # The $limit lets the server stop early and turns the $sort into a top-k sort
+    paged_pipeline.append({"$limit": page_size+1})
+    cursor=collection.aggregate(paged_pipeline, batchSize=page_size+1, **options)
+    try:
+        documents=list(cursor)
+    finally:
+        cursor.close()
+    documents, has_more=documents[:page_size], len(documents)>page_size
+    # Without a total order a later page could repeat or skip documents, /stream reads them all instead
+    following=next_position(mode, position, documents) if has_more else None
+    next_token=encode_page_token(following) if following else None
+    return convert_objectid(documents), next_token
+
+def fetch_preview(collection, pipeline, limit, **options):
+    return fetch_page(collection, pipeline, {"offset": 0}, limit, **options)
+
+def iter_batches(collection, pipeline, batch_size, **options):
+    cursor=collection.aggregate(pipeline, batchSize=batch_size, **options)
+    try:
+        while batch:=list(islice(cursor, batch_size)):
+            yield convert_objectid(batch)
+    finally:
+        cursor.close()
+
+def iter_ndjson(collection, pipeline, batch_size, limit=None, **options):
+    if limit is not None:
+        pipeline=list(pipeline)+[{"$limit": limit}]
+    for batch in iter_batches(collection, pipeline, batch_size, **options):
+        yield "".join(json.dumps(document, ensure_ascii=False)+"\n" for document in batch)
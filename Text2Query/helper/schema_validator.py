@@ -0,0 +1,241 @@
+from configs.paths import DATA_DIR
+import difflib
+import json
+import re
+
+ARRAY_OF = re.compile(r"Array of (\w+)", re.IGNORECASE)
+# Stages that keep the document shape as it is
+PASSTHROUGH_STAGES = {"$limit", "$skip", "$sample", "$sort", "$match", "$unwind", "$count"}
+# Stages whose output shape cannot be derived statically, field checks stop after them
+OPAQUE_STAGES = {"$replaceRoot", "$replaceWith", "$facet", "$bucket", "$bucketAuto", "$graphLookup",
+                 "$unionWith", "$sortByCount", "$densify", "$fill", "$setWindowFields", "$redact"}
+
+def singular(name):
+    name=name.lower()
+    return name[:-1] if name.endswith("s") else name
+
+def field_paths(value, refs):
+    # Collects "$field" references from an aggregation expression, "$$var" are variables
+    if isinstance(value, str):
+        if value.startswith("$") and not value.startswith("$$"):
+            refs.append(value[1:])
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key=="$literal":
+                continue
+            field_paths(item, refs)
+    elif isinstance(value, list):
+        for item in value:
+            field_paths(item, refs)
+    return refs
+
+def match_paths(match, refs):
+    for key, condition in match.items():
+        if key in ("$and", "$or", "$nor") and isinstance(condition, list):
+            for item in condition:
+                if isinstance(item, dict):
+                    match_paths(item, refs)
+        elif key=="$expr":
+            field_paths(condition, refs)
+        elif not key.startswith("$"):
+            refs.append(key)
+    return refs
+
+def normalize(path):
+    # members.0.user -> members.user
+    return ".".join(part for part in path.split(".") if not part.isdigit())
+
+def load_schema(data_dir=DATA_DIR):
+    with open(data_dir/"schema.json", encoding="utf-8") as f:
+        schemas=json.load(f)
+    try:
+        with open(data_dir/"field_desciption.json", encoding="utf-8") as f:
+            descriptions=json.load(f)
+    except FileNotFoundError:
+        descriptions=[]
+
+    collections={}
+    sub_schemas=[]
+    for schema in schemas:
+        if schema.get("type")=="schema":
+            collections[schema["name"]]={"_id", "__v"}|set(schema.get("fields", {}))
+        elif schema.get("type")=="sub-schema":
+            sub_schemas.append(schema)
+
+    def array_field(collection_name, sub_name):
+        for field, description in next((s["fields"] for s in schemas if s.get("name")==collection_name
+                                        and s.get("type")=="schema"), {}).items():
+            match=ARRAY_OF.search(str(description))
+            if match and singular(match.group(1))==singular(sub_name):
+                return field
+        return None
+
+    for schema in sub_schemas:
+        parents=schema.get("parent_collection")
+        for parent in parents if isinstance(parents, list) else [parents]:
+            field=array_field(parent, schema["name"])
+            if parent in collections and field:
+                collections[parent]|={f"{field}.{name}" for name in ["_id", *schema.get("fields", {})]}
+
+    for description in descriptions:
+        if description.get("chunk_type")!="field":
+            continue
+        owners=description.get("collection_name")
+        for owner in owners if isinstance(owners, list) else [owners]:
+            collection_name, _, sub_name=str(owner).partition(".")
+            if collection_name not in collections:
+                continue
+            if sub_name:
+                field=array_field(collection_name, sub_name) or sub_name
+                collections[collection_name].add(f"{field}.{description['name']}")
+            else:
+                collections[collection_name].add(description["name"])
+    return collections
+
+class Shape:
+    def __init__(self, fields, opaque=()):
+        self.fields=set(fields)
+        # Fields whose sub paths are unknown (computed values, $lookup with a pipeline)
+        self.opaque=set(opaque)
+
+    def has(self, path):
+        path=normalize(path)
+        if path in self.fields or path in self.opaque:
+            return True
+        parts=path.split(".")
+        return any(".".join(parts[:idx]) in self.opaque for idx in range(1, len(parts)))
+
+    def add(self, field, sub_fields=None):
+        self.fields.add(field)
+        if sub_fields is None:
+            self.opaque.add(field)
+        else:
+            self.fields|={f"{field}.{sub}" for sub in sub_fields}
+
+    def remove(self, field):
+        self.fields={name for name in self.fields if name!=field and not name.startswith(f"{field}.")}
+        self.opaque={name for name in self.opaque if name!=field and not name.startswith(f"{field}.")}
+
+class SchemaValidator:
+    def __init__(self, collections=None, data_dir=DATA_DIR):
+        self.collections=collections if collections is not None else load_schema(data_dir)
+
+    def unknown(self, errors, idx, stage_name, path, shape, where):
+        suggestion=difflib.get_close_matches(normalize(path), sorted(shape.fields), n=1)
+        hint=f" (did you mean '{suggestion[0]}'?)" if suggestion else ""
+        errors.append(f"Stage {idx} {stage_name}: unknown field '{path}' in {where}{hint}.")
+
+    def check_paths(self, errors, idx, stage_name, paths, shape, where):
+        for path in paths:
+            if path and not shape.has(path):
+                self.unknown(errors, idx, stage_name, path, shape, where)
+
+    def validate(self, query):
+        collection_name=query.get("collection")
+        if collection_name not in self.collections:
+            return [f"Unknown collection '{collection_name}', expected one of {sorted(self.collections)}."]
+        return self.validate_pipeline(collection_name, query.get("aggregate") or [])
+
+    def validate_pipeline(self, collection_name, pipeline, prefix=""):
+        errors=[]
+        shape=Shape(self.collections[collection_name])
+        where=f"'{collection_name}'"
+        for idx, stage in enumerate(pipeline):
+            if not isinstance(stage, dict) or len(stage)!=1:
+                errors.append(f"Stage {prefix}{idx} must have exactly one operator.")
+                continue
+            stage_name, spec=next(iter(stage.items()))
+            label=f"{prefix}{idx}"
+
+            if stage_name=="$match" and isinstance(spec, dict):
+                self.check_paths(errors, label, stage_name, match_paths(spec, []), shape, where)
+            elif stage_name=="$sort" and isinstance(spec, dict):
+                self.check_paths(errors, label, stage_name, list(spec), shape, where)
+            elif stage_name=="$unwind":
+                path=spec.get("path") if isinstance(spec, dict) else spec
+                if isinstance(path, str):
+                    self.check_paths(errors, label, stage_name, [path.lstrip("$")], shape, where)
+                if isinstance(spec, dict) and spec.get("includeArrayIndex"):
+                    shape.add(spec["includeArrayIndex"], [])
+            elif stage_name=="$lookup" and isinstance(spec, dict):
+                errors+=self.check_lookup(label, spec, shape, where)
+            elif stage_name in ("$addFields", "$set") and isinstance(spec, dict):
+                self.check_paths(errors, label, stage_name, field_paths(list(spec.values()), []), shape, where)
+                for field in spec:
+                    shape.add(field)
+            elif stage_name=="$unset":
+                for field in spec if isinstance(spec, list) else [spec]:
+                    shape.remove(str(field))
+            elif stage_name=="$project" and isinstance(spec, dict):
+                shape=self.check_project(errors, label, spec, shape, where)
+            elif stage_name=="$group" and isinstance(spec, dict):
+                self.check_paths(errors, label, stage_name, field_paths(list(spec.values()), []), shape, where)
+                shape=Shape(spec, opaque=spec)
+                where=f"the output of stage {label} $group"
+            elif stage_name=="$count":
+                shape=Shape([spec])
+                where=f"the output of stage {label} $count"
+            elif stage_name in OPAQUE_STAGES:
+                return errors
+            elif stage_name not in PASSTHROUGH_STAGES:
+                continue
+        return errors
+
+    def check_lookup(self, idx, spec, shape, where):
+        errors=[]
+        foreign_name=spec.get("from")
+        if foreign_name not in self.collections:
+            errors.append(f"Stage {idx} $lookup: unknown collection '{foreign_name}' in 'from', "
+                          f"expected one of {sorted(self.collections)}.")
+            if spec.get("as"):
+                shape.add(spec["as"])
+            return errors
+
+        if spec.get("localField"):
+            self.check_paths(errors, idx, "$lookup", [spec["localField"]], shape, where)
+        if spec.get("foreignField"):
+            self.check_paths(errors, idx, "$lookup", [spec["foreignField"]],
+                             Shape(self.collections[foreign_name]), f"'{foreign_name}'")
+        if isinstance(spec.get("let"), dict):
+            self.check_paths(errors, idx, "$lookup", field_paths(list(spec["let"].values()), []), shape, where)
+        if isinstance(spec.get("pipeline"), list):
+            errors+=self.validate_pipeline(foreign_name, spec["pipeline"], prefix=f"{idx}.pipeline.")
+
+        if spec.get("as"):
+            shape.remove(spec["as"])
+            if spec.get("pipeline"):
+                shape.add(spec["as"])
+            else:
+                shape.add(spec["as"], self.collections[foreign_name])
+        return errors
+
+    def check_project(self, errors, idx, spec, shape, where):
+        included=[]
+        excluded=[]
+        computed={}
+        for field, value in spec.items():
+            if value in (0, False):
+                excluded.append(field)
+            elif value in (1, True):
+                included.append(field)
+            else:
+                computed[field]=value
+        self.check_paths(errors, idx, "$project", [field for field in included+excluded if field!="_id"],
+                         shape, where)
+        self.check_paths(errors, idx, "$project", field_paths(list(computed.values()), []), shape, where)
+
+        if not included and not computed:
+            for field in excluded:
+                shape.remove(field)
+            return shape
+
+        projected=Shape([] if "_id" in excluded else ["_id"])
+        for field in included:
+            field=normalize(field)
+            projected.fields|={name for name in shape.fields if name==field or name.startswith(f"{field}.")}
+            projected.opaque|={name for name in shape.opaque if name==field or name.startswith(f"{field}.")}
+            parts=field.split(".")
+            projected.fields|={".".join(parts[:end]) for end in range(1, len(parts)+1)}
+        for field in computed:
+            projected.add(field)
+        return projected
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from configs.paths import DATA_DIR
+import numpy as np
+import threading
+import time
+import uuid
+
+class SemanticCache:
+    def __init__(self, threshold=0.92, max_size=1024, ttl=3600, watch_files=None):
+        self.threshold=threshold
+        self.max_size=max_size
+        self.ttl=ttl
+        # Entries are written on confirm, which also appends to the guideline log, so that log is not watched
+        self.watch_files=watch_files or [DATA_DIR/"syntax_guideline.json",
+                                         DATA_DIR/"schema.json",
+                                         DATA_DIR/"schema_description.json",
+                                         DATA_DIR/"field_desciption.json"]
+        self.entries=OrderedDict()
+        self.lock=threading.Lock()
+        self.fingerprint=self.data_fingerprint()
+        self.hits=0
+        self.misses=0
+        self.literal_mismatches=0
+        self.invalidations=0
+
+    def data_fingerprint(self):
+        fingerprint=[]
+        for path in self.watch_files:
+            try:
+                stat=path.stat()
+                fingerprint.append((path.name, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                fingerprint.append((path.name, None, None))
+        return tuple(fingerprint)
+
+    def check_fingerprint(self):
+        fingerprint=self.data_fingerprint()
+        if fingerprint!=self.fingerprint:
+            self.fingerprint=fingerprint
+            self.entries.clear()
+            self.invalidations+=1
+
+    def evict_expired(self):
+        now=time.monotonic()
+        expired=[key for key, entry in self.entries.items() if now-entry["created_at"]>self.ttl]
+        for key in expired:
+            del self.entries[key]
+
+    def normalize(self, vector):
+        vector=np.asarray(vector, dtype=np.float32)
+        norm=np.linalg.norm(vector)
+        return vector/norm if norm else vector
+
+    def get(self, vector, literals=None):
+        with self.lock:
+            self.check_fingerprint()
+            self.evict_expired()
+            if not self.entries:
+                self.misses+=1
+                return None
+
+            keys=list(self.entries.keys())
+            matrix=np.stack([self.entries[key]["vector"] for key in keys])
+            scores=matrix@self.normalize(vector)
+            for best in np.argsort(-scores):
+                if scores[best]<self.threshold:
+                    break
+                key=keys[best]
+                # Same question about another name, number or date needs another query
+                if self.entries[key]["literals"]!=literals:
+                    self.literal_mismatches+=1
+                    continue
+                self.entries.move_to_end(key)
+                self.hits+=1
+                return self.entries[key]["raw_query"]
+            self.misses+=1
+            return None
+
+    def put(self, vector, raw_query, literals=None):
+        with self.lock:
+            self.check_fingerprint()
+            self.entries[str(uuid.uuid4())]={
+                "vector": self.normalize(vector),
+                "raw_query": raw_query,
+                "literals": literals,
+                "created_at": time.monotonic()
+            }
+            while len(self.entries)>self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.invalidations+=1
+
+    def stats(self):
+        with self.lock:
+            total=self.hits+self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits/total if total else 0.0,
+                "literal_mismatches": self.literal_mismatches,
+                "size": len(self.entries),
+                "invalidations": self.invalidations
+            }
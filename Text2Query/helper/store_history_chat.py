@@ -1,29 +1,30 @@
 import json
-def init_session(session_id):
-    session = {
-        "session_id": session_id,
-        "history_chat": []
-    }
-    return session
 
-def add_chat(redis, session_id, user, bot):
-    key = f"session:{session_id}"
-    raw = redis.get(key)
-    if raw:
-        session = json.loads(raw)
-    else:
-        session = init_session(session_id)
-        
-    session["history_chat"].append({"user": user, "bot": bot})
+def history_key(session_id):
+    return f"chat:{session_id}"
 
-    redis.setex(key, 600, json.dumps(session))
-    return raw
+def summarize_result(result, preview_size=3, max_chars=500):
+    preview=[]
+    for document in result[:preview_size]:
+        raw=json.dumps(document, ensure_ascii=False, default=str)
+        preview.append(raw if len(raw)<=max_chars else raw[:max_chars]+"...")
+    return {"count": len(result), "preview": preview}
 
-def get_chat(redis, session_id):
-    key=f"session:{session_id}"
-    return redis.get(key)
+def add_chat(redis, session_id, user, bot, max_turns=20, ttl=600):
+    key = history_key(session_id)
+    turn = json.dumps({"user": user, "bot": summarize_result(bot)}, ensure_ascii=False, default=str)
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.rpush(key, turn)
+    pipe.ltrim(key, -max_turns, -1)
+    pipe.expire(key, ttl)
+    length, _, _ = pipe.execute()
+    return length
+
+def get_chat(redis, session_id, last_n=5):
+    key=history_key(session_id)
+    return [json.loads(turn) for turn in redis.lrange(key, -last_n, -1)]
 
 def clear_chat(redis,session_id):
-    key=f"session:{session_id}"
+    key=history_key(session_id)
     redis.delete(key)
-    
\ No newline at end of file
@@ -0,0 +1,43 @@
+from helper.metrics import metrics
+from configs.settings import settings
+from functools import wraps
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+def get_tracer():
+    if trace is None or not settings.otel_enabled:
+        return None
+    return trace.get_tracer("text2query")
+
+def traced(name, node):
+    @wraps(node)
+    def wrapper(state):
+        tracer=get_tracer()
+        start=time.perf_counter()
+        try:
+            if tracer is None:
+                return node(state)
+            with tracer.start_as_current_span(f"text2query.{name}") as span:
+                span.set_attribute("text2query.session_id", state.session_id)
+                span.set_attribute("text2query.llm_retry_count", state.llm_retry_count)
+                return node(state)
+        except Exception:
+            metrics.increment("pipeline_node_errors_total", labels={"node": name})
+            raise
+        finally:
+            metrics.observe("pipeline_node_seconds", time.perf_counter()-start, {"node": name})
+    return wrapper
+
+def record_llm_usage(call, response):
+    if (getattr(response, "response_metadata", None) or {}).get("cached"):
+        metrics.increment("llm_cached_responses_total", labels={"call": call})
+        return
+    usage=getattr(response, "usage_metadata", None) or {}
+    metrics.increment("llm_calls_total", labels={"call": call})
+    if usage:
+        metrics.increment("llm_tokens_total", usage.get("input_tokens", 0), {"call": call, "type": "input"})
+        metrics.increment("llm_tokens_total", usage.get("output_tokens", 0), {"call": call, "type": "output"})
@@ -1,18 +1,32 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import AutoTokenizer
 import torch
 from configs.settings import settings
 from configs.paths import MODEL_DIR
+from helper.batch_scheduler import MicroBatcher
+from helper.inference_backend import load_seq2seq, resolve_device
 class Translator:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, batching=False, backend=None):
+        self.device = resolve_device(backend)
         model_path = f"{MODEL_DIR}/{settings.model_registry['translator']}"
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path).to(self.device)
+        self.model = load_seq2seq(model_path, self.device, backend)
+        self.batcher = None
+        if batching:
+            self.batcher = MicroBatcher(lambda langs, texts: self.translate_batch(texts, *langs),
+                                        max_batch_size=settings.inference_max_batch_size,
+                                        max_wait_ms=settings.inference_max_wait_ms,
+                                        name="translator-batcher")
 
     def translate(self,text, src_lang="vie_Latn", tgt_lang="eng_Latn"):
+        if self.batcher:
+            return self.batcher.call((src_lang, tgt_lang), text)
+        return self.translate_batch([text], src_lang, tgt_lang)[0]
+
+    def translate_batch(self,texts, src_lang="vie_Latn", tgt_lang="eng_Latn"):
         self.tokenizer.src_lang = src_lang
-        encoded = self.tokenizer(text, return_tensors="pt").to(self.model.device)
-        generated_tokens = self.model.generate(
-            **encoded, forced_bos_token_id=self.tokenizer.convert_tokens_to_ids(tgt_lang), max_length=512
-        )
-        return self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+        encoded = self.tokenizer(texts, return_tensors="pt", padding=True).to(self.model.device)
+        with torch.inference_mode():
+            generated_tokens = self.model.generate(
+                **encoded, forced_bos_token_id=self.tokenizer.convert_tokens_to_ids(tgt_lang), max_length=512
+            )
+        return self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
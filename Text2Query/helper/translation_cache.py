@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+import unicodedata
+import re
+
+VIETNAMESE_CHARS = set("ăâđêôơưáàảãạắằẳẵặấầẩẫậéèẻẽẹếềểễệíìỉĩịóòỏõọốồổỗộớờởỡợúùủũụứừửữựýỳỷỹỵ")
+VIETNAMESE_WORDS = {
+    "cua", "cac", "nhung", "trong", "duoc", "khong", "cho", "voi", "nguoi", "viec",
+    "cong", "du", "tim", "tat", "ca", "bao", "nhieu", "nao", "ngay", "tuan",
+    "thang", "han", "qua", "nhiem", "vu", "thanh", "vien", "lam", "da", "chua"
+}
+WORD_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def detect_language(text):
+    lowered=unicodedata.normalize("NFC", text).lower()
+    if any(char in VIETNAMESE_CHARS for char in lowered):
+        return "vi"
+
+    words=WORD_PATTERN.findall(lowered)
+    if not words:
+        return "en"
+    if not lowered.isascii():
+        return "vi"
+    # Vietnamese typed without diacritics is mostly short syllables from a small vocabulary
+    vietnamese_words=sum(1 for word in words if word in VIETNAMESE_WORDS)
+    return "vi" if vietnamese_words/len(words)>=0.4 else "en"
+
+class CachedTranslator:
+    def __init__(self, translator, redis=None, max_size=2048, ttl=86400):
+        self.translator=translator
+        self.redis=redis
+        self.max_size=max_size
+        self.ttl=ttl
+        self.entries=OrderedDict()
+        self.lock=threading.Lock()
+        self.hits=0
+        self.misses=0
+        self.skipped=0
+        self.translate_seconds=0.0
+
+    def cache_key(self, text, src_lang, tgt_lang):
+        digest=hashlib.sha1(f"{src_lang}:{tgt_lang}:{text}".encode("utf-8")).hexdigest()
+        return f"translate:{digest}"
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        if self.redis is not None:
+            value=self.redis.get(key)
+            if value is not None:
+                self.set_local(key, value)
+                return value
+        return None
+
+    def set_local(self, key, value):
+        with self.lock:
+            self.entries[key]=value
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.max_size:
+                self.entries.popitem(last=False)
+
+    def set(self, key, value):
+        self.set_local(key, value)
+        if self.redis is not None:
+            self.redis.setex(key, self.ttl, value)
+
+    def translate(self, text, src_lang="vie_Latn", tgt_lang="eng_Latn"):
+        text=normalize_text(text)
+        if tgt_lang=="eng_Latn" and detect_language(text)=="en":
+            with self.lock:
+                self.skipped+=1
+            return text
+
+        key=self.cache_key(text, src_lang, tgt_lang)
+        cached=self.get(key)
+        if cached is not None:
+            with self.lock:
+                self.hits+=1
+            return cached
+
+        start=time.perf_counter()
+        translated=self.translator.translate(text, src_lang=src_lang, tgt_lang=tgt_lang)
+        elapsed=time.perf_counter()-start
+        with self.lock:
+            self.misses+=1
+            self.translate_seconds+=elapsed
+        self.set(key, translated)
+        return translated
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups=self.hits+self.misses
+            avg_seconds=self.translate_seconds/self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_english": self.skipped,
+                "hit_rate": self.hits/lookups if lookups else 0.0,
+                "size": len(self.entries),
+                "avg_translate_seconds": avg_seconds,
+                "estimated_seconds_saved": avg_seconds*(self.hits+self.skipped)
+            }
@@ -1,8 +1,20 @@
 from text2query.graph import Text2QueryPipeline
 from fastapi import FastAPI,HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Optional
 from dto.request.text_to_query_request import Text2QueryRequest
 from dto.request.confirm_request import ConfirmRequest
+from dto.response.text_to_query_response import Text2QueryResponse
+from dto.response.result_page_response import ResultPageResponse
 from fastapi.middleware.cors import CORSMiddleware
+from text2query.services import services
+from configs.settings import settings
+from helper.connections import pool_config
+from helper.metrics import metrics
+import logging
+
+logging.basicConfig(level=settings.log_level.upper())
+logger = logging.getLogger(__name__)
 
 app=FastAPI()
 pipeline=Text2QueryPipeline()
@@ -15,16 +27,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def log_warm_up_failure(future):
+    if future.exception() is not None:
+        logger.error("Startup warm-up failed", exc_info=future.exception())
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if settings.warmup_on_startup:
+        pipeline.executor.submit(services.warm_up).add_done_callback(log_warm_up_failure)
+
+@app.post("/warmup")
+async def warm_up():
+    return await pipeline.run_in_executor(services.warm_up)
+
+@app.get("/health/ready")
+async def readiness():
+    report=services.startup_report()
+    if not report["ready"]:
+        raise HTTPException(status_code=503, detail=report)
+    return report
+
 @app.post("/text2query")
 async def text_to_query(request: Text2QueryRequest):
-    result=pipeline.start_query(request.prompt)
-    return result
+    session_id,result,next_page_token=await pipeline.astart_query(request.prompt)
+    return Text2QueryResponse(session_id=session_id,result=result,next_page_token=next_page_token)
 
 @app.post("/confirm_query")
 async def confirm_query(request: ConfirmRequest):
-    if request.is_confirm:
-        return pipeline.confirm()
-    else:
-        if not request.new_prompt or not request.new_prompt.strip():
-            raise HTTPException(status_code=400, detail="New prompt must not be blank")
-        return pipeline.reject(request.new_prompt.strip())
\ No newline at end of file
+    try:
+        if request.is_confirm:
+            return await pipeline.aconfirm(request.session_id)
+        else:
+            if not request.new_prompt or not request.new_prompt.strip():
+                raise HTTPException(status_code=400, detail="New prompt must not be blank")
+            session_id,result,next_page_token=await pipeline.areject(request.session_id,request.new_prompt.strip())
+            return Text2QueryResponse(session_id=session_id,result=result,next_page_token=next_page_token)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+@app.get("/results/{session_id}")
+async def result_page(session_id: str, page_token: Optional[str]=None, page_size: Optional[int]=None):
+    try:
+        result,next_page_token=await pipeline.afetch_page(session_id,page_token,page_size)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session has no executable query")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ResultPageResponse(session_id=session_id,result=result,next_page_token=next_page_token)
+
+@app.get("/results/{session_id}/stream")
+async def stream_results(session_id: str):
+    try:
+        lines,limit=await pipeline.run_in_executor(pipeline.stream_results,session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Session has no executable query")
+    headers={"X-Result-Limit": str(limit)} if limit is not None else None
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats={}
+    if "semantic_cache" in services.instances:
+        stats["semantic_cache"]=services.semantic_cache.stats()
+    if "translator" in services.instances:
+        stats["translation_cache"]=services.translator.stats()
+    if "llm" in services.instances and hasattr(services.llm, "stats"):
+        stats["llm_cache"]=services.llm.stats()
+    return stats
+
+@app.get("/metrics/connections")
+async def connection_metrics():
+    snapshot=metrics.snapshot()
+    prefixes=("mongo_","redis_","vector_search_")
+    return {
+        "config": pool_config(),
+        "histograms": [h for h in snapshot["histograms"] if h["name"].startswith(prefixes)],
+        "counters": [c for c in snapshot["counters"] if c["name"].startswith(prefixes)],
+        "gauges": [g for g in snapshot["gauges"] if g["name"].startswith(prefixes)]
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    extra_gauges={}
+    if "semantic_cache" in services.instances:
+        for key, value in services.semantic_cache.stats().items():
+            extra_gauges[f"semantic_cache_{key}"]=value
+    if "translator" in services.instances:
+        for key, value in services.translator.stats().items():
+            extra_gauges[f"translation_cache_{key}"]=value
+    if "llm" in services.instances and hasattr(services.llm, "stats"):
+        for key, value in services.llm.stats().items():
+            extra_gauges[f"llm_cache_{key}"]=value
+    return metrics.render_prometheus(extra_gauges)
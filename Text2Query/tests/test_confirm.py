@@ -0,0 +1,57 @@
+import argparse
+import json
+import pytest
+
+pytest.importorskip("mongomock")
+pytest.importorskip("fakeredis")
+pytest.importorskip("langgraph")
+
+from benchmark.pipeline_replay import install_services
+from langchain_core.messages import AIMessage
+from configs.settings import settings
+from text2query.services import services
+from text2query.graph import Text2QueryPipeline
+
+VALID_QUERY = {"collection": "users", "aggregate": [{"$match": {"name": {"$exists": True}}}]}
+
+class ScriptedLLM:
+    # First answer is not JSON, every fix afterwards is a valid query
+    def invoke(self, prompt):
+        content="not a query" if "User question:" in prompt else json.dumps(VALID_QUERY)
+        return AIMessage(content=content)
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    args=argparse.Namespace(checkpointer="memory", no_semantic_cache=True, llm_latency_ms=0.0,
+                            llm_jitter_ms=0.0, seed=0, documents=20)
+    install_services(args, [])
+    services.instances["llm"]=ScriptedLLM()
+    monkeypatch.setattr(settings, "template_enabled", False)
+    monkeypatch.setattr(settings, "index_advisor_enabled", False)
+    return Text2QueryPipeline()
+
+def guideline_count():
+    return sum(1 for _ in services.guideline_store.iter_entries())
+
+def test_confirm_refuses_run_stopped_at_retry_limit(pipeline, monkeypatch):
+    # The fix on the last allowed retry validates, but the retry limit sends the run to error_node unexecuted
+    monkeypatch.setattr(settings, "max_llm_retry", 1)
+    session_id,result,_=pipeline.start_query("List every user name")
+    state=pipeline.load_state(session_id)
+    assert state.query and not state.is_error and not state.is_executed
+    assert "Error" in result[0]
+
+    before=guideline_count()
+    assert "exception" in pipeline.confirm(session_id)[0]
+    assert guideline_count()==before
+    with pytest.raises(KeyError):
+        pipeline.load_query(session_id)
+
+def test_confirm_accepts_executed_run(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "max_llm_retry", 3)
+    session_id,_,_=pipeline.start_query("List every user name")
+    assert pipeline.load_state(session_id).is_executed
+
+    before=guideline_count()
+    assert "success" in pipeline.confirm(session_id)[0]
+    assert guideline_count()==before+1
@@ -0,0 +1,111 @@
+from helper.query_templates import find_slots, instantiate, match_guidelines, prompt_literals
+import json
+
+SPRINT_QUERY = {
+    "collection": "tasks",
+    "aggregate": [
+        {"$match": {"sprint": 1}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 1}
+    ]
+}
+
+PRIORITY_QUERY = {
+    "collection": "tasks",
+    "aggregate": [
+        {"$match": {"priority": 1}},
+        {"$sort": {"dueDate": 1}},
+        {"$project": {"title": 1, "dueDate": 1}}
+    ]
+}
+
+def test_number_slot_only_rewrites_match_literal():
+    query=instantiate("Count tasks of sprint 4 grouped by status",
+                      "Count tasks of sprint 1 grouped by status", SPRINT_QUERY)
+    assert query["aggregate"][0]=={"$match": {"sprint": 4}}
+    assert query["aggregate"][1]["$group"]["count"]=={"$sum": 1}
+    assert query["aggregate"][3]=={"$limit": 1}
+
+def test_number_slot_leaves_sort_and_project_alone():
+    query=instantiate("Find tasks with priority 3 sorted by due date",
+                      "Find tasks with priority 1 sorted by due date", PRIORITY_QUERY)
+    assert query["aggregate"]==[
+        {"$match": {"priority": 3}},
+        {"$sort": {"dueDate": 1}},
+        {"$project": {"title": 1, "dueDate": 1}}
+    ]
+
+def test_guideline_query_is_not_mutated():
+    instantiate("Count tasks of sprint 9 grouped by status", "Count tasks of sprint 1 grouped by status", SPRINT_QUERY)
+    assert SPRINT_QUERY["aggregate"][0]=={"$match": {"sprint": 1}}
+
+def test_operator_arguments_are_not_slots():
+    query={"aggregate": [{"$match": {"status": "done"}}, {"$limit": 5}]}
+    assert find_slots("Show the top 5 done tasks", query)==[]
+    assert instantiate("Show the top 10 done tasks", "Show the top 5 done tasks", query) is None
+
+def test_text_slot_only_rewrites_match_literal():
+    query={"aggregate": [
+        {"$match": {"name": "Soctrip Travel"}},
+        {"$project": {"label": {"$literal": "Soctrip Travel"}}}
+    ]}
+    filled=instantiate("Find the project Acme Tours", "Find the project Soctrip Travel", query)
+    assert filled["aggregate"][0]=={"$match": {"name": "Acme Tours"}}
+    assert filled["aggregate"][1]=={"$project": {"label": {"$literal": "Soctrip Travel"}}}
+
+def test_regex_slot_is_escaped():
+    query={"aggregate": [{"$match": {"title": {"$regex": "login", "$options": "i"}}}]}
+    filled=instantiate("Tasks titled 'c++ build'", "Tasks titled 'login'", query)
+    assert filled["aggregate"][0]["$match"]["title"]=={"$regex": "c\\+\\+\\ build", "$options": "i"}
+
+def test_date_slot():
+    query={"aggregate": [{"$match": {"createdAt": {"$gte": {"__datetime__": "7_DAYS_AGO"}}}}]}
+    filled=instantiate("Tasks created in the last 30 days", "Tasks created in the last 7 days", query)
+    assert filled["aggregate"][0]["$match"]["createdAt"]=={"$gte": {"__datetime__": "30_DAYS_AGO"}}
+
+def test_lookup_pipeline_literals_are_slots():
+    query={"aggregate": [
+        {"$lookup": {"from": "users", "as": "owner", "pipeline": [{"$match": {"age": 30}}, {"$limit": 30}]}}
+    ]}
+    filled=instantiate("Owners aged 41", "Owners aged 30", query)
+    assert filled["aggregate"][0]["$lookup"]["pipeline"]==[{"$match": {"age": 41}}, {"$limit": 30}]
+
+def test_different_prompt_does_not_match():
+    assert instantiate("Delete every task", "Count tasks of sprint 1 grouped by status", SPRINT_QUERY) is None
+
+def test_match_guidelines_skips_low_scores_and_other_chunks():
+    guideline={"prompt": "Count tasks of sprint 1 grouped by status", "query": SPRINT_QUERY}
+    context=[
+        {"chunk_type": "schema", "content": "{}", "score": 0.99},
+        {"chunk_type": "syntax_guideline", "content": json.dumps(guideline), "score": 0.5}
+    ]
+    assert match_guidelines("Count tasks of sprint 2 grouped by status", context, 0.8)==(None, None)
+    query,score=match_guidelines("Count tasks of sprint 2 grouped by status", context, 0.4)
+    assert score==0.5 and query["aggregate"][0]=={"$match": {"sprint": 2}}
+
+def test_prompt_literals():
+    assert prompt_literals("Show tasks assigned to Lan in sprint 4")==["4", "lan"]
+    assert prompt_literals("Show tasks assigned to Lan in sprint 4")!=prompt_literals("Show tasks assigned to Minh in sprint 4")
+    assert prompt_literals("Tasks titled 'login page'")==["login page"]
+
+ASSIGNEE_QUERY = {"collection": "tasks", "aggregate": [{"$match": {"assignee": "Bảo"}}]}
+PROJECT_QUERY = {"collection": "projects", "aggregate": [{"$match": {"name": "Soctrip Travel"}}]}
+
+def test_name_slot_takes_another_name():
+    filled=instantiate("Show tasks assigned to Phúc Hào", "Show tasks assigned to Bảo", ASSIGNEE_QUERY)
+    assert filled["aggregate"][0]=={"$match": {"assignee": "Phúc Hào"}}
+
+def test_name_slot_rejects_clauses():
+    assert instantiate("Show tasks assigned to anyone except Minh", "Show tasks assigned to Bảo", ASSIGNEE_QUERY) is None
+    assert instantiate("Show tasks assigned to Lan and not done", "Show tasks assigned to Bảo", ASSIGNEE_QUERY) is None
+    assert instantiate("Find the project that has the most overdue tasks",
+                       "Find the project Soctrip Travel", PROJECT_QUERY) is None
+
+def test_quoted_slot_stays_inside_quotes():
+    query={"aggregate": [{"$match": {"title": "login"}}]}
+    assert instantiate("Tasks titled 'login' or 'signup'", "Tasks titled 'login'", query) is None
+
+def test_number_slot_takes_digits_only():
+    assert instantiate("Count tasks of sprint four grouped by status",
+                       "Count tasks of sprint 1 grouped by status", SPRINT_QUERY) is None
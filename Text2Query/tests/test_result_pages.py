@@ -0,0 +1,35 @@
+from helper.result_pages import order_pipeline, output_key, decode_page_token, encode_page_token
+from bson import ObjectId
+
+def test_unsorted_pipeline_pages_by_id():
+    ordered,mode=order_pipeline([{"$match": {"status": "done"}}])
+    assert ordered[-1]=={"$sort": {"_id": 1}} and mode=="keyset"
+
+def test_user_sort_gets_id_tie_break():
+    ordered,mode=order_pipeline([{"$sort": {"dueDate": -1}}, {"$project": {"title": 1}}])
+    assert ordered[0]=={"$sort": {"dueDate": -1, "_id": 1}} and mode=="offset"
+
+def test_unwind_pages_by_offset():
+    assert order_pipeline([{"$unwind": "$members"}])[1]=="offset"
+
+def test_dropped_id_sorts_on_projected_fields():
+    ordered,mode=order_pipeline([{"$project": {"_id": 0, "title": 1, "status": 1}}])
+    assert ordered[-1]=={"$sort": {"title": 1, "status": 1}} and mode=="offset"
+
+def test_dropped_id_before_user_sort():
+    ordered,mode=order_pipeline([{"$project": {"_id": 0, "title": 1}}, {"$sort": {"title": -1}}])
+    assert ordered[-1]=={"$sort": {"title": -1}} and mode=="offset"
+
+def test_unknown_output_has_no_paging():
+    assert order_pipeline([{"$project": {"_id": 0, "password": 0}}])[1] is None
+    assert order_pipeline([{"$replaceRoot": {"newRoot": "$owner"}}])[1] is None
+    assert order_pipeline([{"$unset": ["_id", "password"]}])[1] is None
+    assert order_pipeline([{"$set": {"_id": "$status"}}])[1] is None
+
+def test_grouping_restores_id():
+    assert output_key([{"$project": {"_id": 0, "status": 1}}, {"$group": {"_id": "$status"}}])==["_id"]
+
+def test_page_token_round_trip():
+    oid=ObjectId()
+    assert decode_page_token(encode_page_token({"after": oid}))=={"after": oid}
+    assert decode_page_token(None)=={"offset": 0}
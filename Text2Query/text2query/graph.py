@@ -1,28 +1,36 @@
 from langgraph.graph import StateGraph,START,END
-from text2query.nodes import (translate_node, retrieve_node, generate_query_node,
-                   validate_query_node, execute_query_node,handle_error_node
+from text2query.nodes import (translate_node, cache_lookup_node, retrieve_node, template_match_node,
+                   generate_query_node,
+                   validate_query_node, guard_query_node, execute_query_node,handle_error_node
                    ,result_node,rewrite_prompt_node,error_node)
 from text2query.state import State
 from configs.settings import settings
-from helper import store_history_chat
-from langgraph.checkpoint.memory import MemorySaver
-import uuid,json
+from helper import store_history_chat,query_templates
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import uuid,json,asyncio
 from text2query.services import services
-from configs.paths import DATA_DIR
+from helper.debug_state import convert_objectid
+from helper import result_pages
+from helper.tracing import traced
 class Text2QueryPipeline:
     def __init__(self):
         self.graph=StateGraph(State)
-        self.state=None
-        self.memory=MemorySaver()
-        self.graph.add_node("translate_node",translate_node)
-        self.graph.add_node("retrieve_node",retrieve_node)
-        self.graph.add_node("generate_query_node",generate_query_node)
-        self.graph.add_node("validate_query_node",validate_query_node)
-        self.graph.add_node("execute_query_node",execute_query_node)
-        self.graph.add_node("handle_error_node",handle_error_node)
-        self.graph.add_node("result_node",result_node)
-        self.graph.add_node("rewrite_prompt_node",rewrite_prompt_node)
-        self.graph.add_node("error_node",error_node)
+        self.memory=services.checkpointer
+        self.executor=ThreadPoolExecutor(max_workers=settings.pipeline_max_workers,
+                                         thread_name_prefix="text2query")
+        self.graph.add_node("translate_node",traced("translate_node",translate_node))
+        self.graph.add_node("cache_lookup_node",traced("cache_lookup_node",cache_lookup_node))
+        self.graph.add_node("retrieve_node",traced("retrieve_node",retrieve_node))
+        self.graph.add_node("template_match_node",traced("template_match_node",template_match_node))
+        self.graph.add_node("generate_query_node",traced("generate_query_node",generate_query_node))
+        self.graph.add_node("validate_query_node",traced("validate_query_node",validate_query_node))
+        self.graph.add_node("guard_query_node",traced("guard_query_node",guard_query_node))
+        self.graph.add_node("execute_query_node",traced("execute_query_node",execute_query_node))
+        self.graph.add_node("handle_error_node",traced("handle_error_node",handle_error_node))
+        self.graph.add_node("result_node",traced("result_node",result_node))
+        self.graph.add_node("rewrite_prompt_node",traced("rewrite_prompt_node",rewrite_prompt_node))
+        self.graph.add_node("error_node",traced("error_node",error_node))
         self.build_graph()
         
         self.app=self.graph.compile(checkpointer=self.memory)
@@ -36,6 +44,18 @@ class Text2QueryPipeline:
         else:
             return "no"
     
+    def check_cache_hit(self,state):
+        if state.is_cache_hit:
+            return "hit"
+        else:
+            return "miss"
+    
+    def check_template_hit(self,state):
+        if state.is_template_hit:
+            return "hit"
+        else:
+            return "miss"
+    
     def check_llm_retry_and_error(self,state):
         if state.llm_retry_count >= settings.max_llm_retry:
             return "stop"
@@ -54,11 +74,29 @@ class Text2QueryPipeline:
                                              "stop": "error_node"
                                          })
         self.graph.add_edge("rewrite_prompt_node","translate_node")
-        self.graph.add_edge("translate_node","retrieve_node")
-        self.graph.add_edge("retrieve_node","generate_query_node")
+        self.graph.add_edge("translate_node","cache_lookup_node")
+        self.graph.add_conditional_edges("cache_lookup_node",self.check_cache_hit,
+                                         {
+                                             "hit": "validate_query_node",
+                                             "miss": "retrieve_node"
+                                         })
+        self.graph.add_edge("retrieve_node","template_match_node")
+        self.graph.add_conditional_edges("template_match_node",self.check_template_hit,
+                                         {
+                                             "hit": "validate_query_node",
+                                             "miss": "generate_query_node"
+                                         })
         self.graph.add_edge("generate_query_node","validate_query_node")
 
         self.graph.add_conditional_edges("validate_query_node",
+                                         self.check_llm_retry_and_error,
+                                         {
+                                             "error": "handle_error_node",
+                                             "ok": "guard_query_node",
+                                             "stop": "error_node"
+                                         })
+
+        self.graph.add_conditional_edges("guard_query_node",
                                          self.check_llm_retry_and_error,
                                          {
                                              "error": "handle_error_node",
@@ -79,53 +117,98 @@ class Text2QueryPipeline:
         
         self.app=self.graph.compile(checkpointer=self.memory)
 
-    def start_query(self, prompt):
-        session_id=str(uuid.uuid4())
-        self.state = State(prompt=prompt,session_id=session_id)
-        self.config = {
+    def build_config(self, session_id):
+        return {
                 "configurable": {"thread_id": session_id},
                 "recursion_limit": 50
             }
-        
-        state_dict=self.app.invoke(self.state,config=self.config)
-        self.state=State.model_validate(state_dict)
-        print(type(self.state))
-        return self.state.result
+
+    def load_state(self, session_id):
+        snapshot=self.app.get_state(self.build_config(session_id))
+        if not snapshot.values:
+            raise KeyError(session_id)
+        return State.model_validate(snapshot.values)
+
+    def start_query(self, prompt):
+        session_id=str(uuid.uuid4())
+        state = State(prompt=prompt,session_id=session_id)
+        state_dict=self.app.invoke(state,config=self.build_config(session_id))
+        state=State.model_validate(state_dict)
+        return session_id, state.result, state.next_page_token
+
+    def load_query(self, session_id):
+        state=self.load_state(session_id)
+        if not state.is_executed or not state.query or state.is_error:
+            raise KeyError(session_id)
+        return services.db[state.query["collection"]], state.query["aggregate"], state.query_options
+
+    def fetch_page(self, session_id, page_token=None, page_size=None):
+        if page_size is not None and page_size<1:
+            raise ValueError("page_size must be a positive integer")
+        page_size=min(page_size or settings.result_preview_limit, settings.result_max_page_size)
+        position=result_pages.decode_page_token(page_token)
+        collection,pipeline,options=self.load_query(session_id)
+        return result_pages.fetch_page(collection, pipeline, position, page_size, **options)
+
+    def stream_results(self, session_id):
+        collection,pipeline,options=self.load_query(session_id)
+        limit=services.query_guard.stream_limit()
+        return result_pages.iter_ndjson(collection, pipeline, settings.result_batch_size, limit, **options), limit
     
-    def confirm(self):
+    def confirm(self, session_id):
+        state=self.load_state(session_id)
+        if not state.is_executed or not state.query or state.is_error:
+            # A failed run, or one stopped at the retry limit before executing, must not become a guideline
+            return [{"exception": "Phiên này không có truy vấn hợp lệ để xác nhận"}]
         try:
+            try:
+                # The query as generated keeps __datetime__ markers, so relative dates stay relative
+                query=json.loads(state.cleaned_raw_query)
+            except json.JSONDecodeError:
+                query=convert_objectid(state.query)
             guideline = {
                 "chunk_type": "syntax_guideline",
-                "collection_name": self.state.query.get("collection"),
-                "prompt": self.state.translated,  
-                "query": self.state.query,                
+                "collection_name": query.get("collection"),
+                "prompt": state.translated,  
+                "query": query,                
                 "metadata": {
                     "languages": "en"
                 }
             }
-            data_path=DATA_DIR/"syntax_guideline.json"
-            if data_path.exists():
-                with open(data_path,"r",encoding="utf-8") as f:
-                    data=json.load(f)
-                if not isinstance(data,list):
-                    data= []
-            else:
-                data=[]
-            
-            data.append(guideline)
-            with open(data_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            services.guideline_store.append(guideline)
+            if settings.semantic_cache_enabled and not state.is_again and not state.is_cache_hit:
+                # Only queries the user confirmed are served to later questions
+                embedding=services.vector_search.embedder.embed_query(state.translated)
+                services.semantic_cache.put(embedding,state.cleaned_raw_query,
+                                            query_templates.prompt_literals(state.translated))
                 
-            store_history_chat.clear_chat(services.redis,self.state.session_id)
+            store_history_chat.clear_chat(services.redis,state.session_id)
             return [{"success": "Đã xác nhận kết quả truy vấn"}]
             
         except Exception as e:
             return [{"exception":f"Không thể lưu syntax ra file: {e}"}] 
             
-    def reject(self, new_prompt):
-        self.state.prompt=new_prompt
-        self.state.is_again=True
-        state_dict=self.app.invoke(self.state,config=self.config)
-        self.state=State.model_validate(state_dict)
-        return self.state.result
-    
+    def reject(self, session_id, new_prompt):
+        state=self.load_state(session_id)
+        state.prompt=new_prompt
+        state.is_again=True
+        state.is_executed=False
+        state_dict=self.app.invoke(state,config=self.build_config(session_id))
+        state=State.model_validate(state_dict)
+        return session_id, state.result, state.next_page_token
+
+    async def run_in_executor(self, func, *args):
+        loop=asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def astart_query(self, prompt):
+        return await self.run_in_executor(self.start_query, prompt)
+
+    async def aconfirm(self, session_id):
+        return await self.run_in_executor(self.confirm, session_id)
+
+    async def areject(self, session_id, new_prompt):
+        return await self.run_in_executor(self.reject, session_id, new_prompt)
+
+    async def afetch_page(self, session_id, page_token=None, page_size=None):
+        return await self.run_in_executor(self.fetch_page, session_id, page_token, page_size)
@@ -1,24 +1,65 @@
 from text2query.services import services
 from pymongo.errors import PyMongoError
 from configs.constant import EXAMPLE_QUERY_JSON,DATE_FORMAT
-from helper import clean_raw_query,store_history_chat
-from text2query.state import print_state
+from helper import clean_raw_query,store_history_chat,context_builder,query_templates
+from text2query.state import log_state
 import json
-from helper import debug_state
+import logging
+from helper import result_pages
+from helper.metrics import metrics
+from helper.tracing import record_llm_usage
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
  
 def translate_node(state):
     state.translated=services.translator.translate(state.prompt)
     return state
 
+def cache_lookup_node(state):
+    state.is_cache_hit=False
+    state.context=[]
+    if not settings.semantic_cache_enabled:
+        return state
+    
+    state.prompt_embedding=services.vector_search.embedder.embed_query(state.translated)
+    if state.is_again:
+        # A rewritten follow-up depends on the chat history, a cached answer would ignore it
+        return state
+    cached_query=services.semantic_cache.get(state.prompt_embedding,query_templates.prompt_literals(state.translated))
+    if cached_query:
+        state.raw_query=cached_query
+        state.is_cache_hit=True
+    metrics.increment("semantic_cache_lookups_total", labels={"result": "hit" if state.is_cache_hit else "miss"})
+    return state
+
 def retrieve_node(state):
-    docs=services.vector_search.search_with_score(state.translated)
-    for doc, score in docs:
-        state.context.append({
-            "content":doc.page_content,
-            "score":score
-        })
+    if state.prompt_embedding and hasattr(services.vector_search,"search_by_vector"):
+        docs=services.vector_search.search_by_vector(state.prompt_embedding,top_k=settings.context_top_k)
+    else:
+        docs=services.vector_search.search_with_score(state.translated,top_k=settings.context_top_k)
+    # Rebuilt on every run so rejected prompts do not stack up stale chunks
+    state.context=context_builder.build_context(docs,
+                                                min_score=settings.context_min_score,
+                                                token_budget=settings.context_token_budget,
+                                                guideline_boost=settings.context_guideline_boost)
+    metrics.increment("context_chunks_total", len(state.context))
+    metrics.increment("context_tokens_total", sum(context_builder.estimate_tokens(chunk["content"])
+                                                  for chunk in state.context))
     return state
 
+def template_match_node(state):
+    # A question shaped like a confirmed guideline reuses its query with the new names, numbers and dates
+    state.is_template_hit=False
+    if not settings.template_enabled:
+        return state
+    query,score=query_templates.match_guidelines(state.translated,state.context,settings.template_min_score)
+    if query is not None:
+        state.raw_query=json.dumps(query, ensure_ascii=False)
+        state.is_template_hit=True
+        logger.debug("matched guideline template with score %.3f", score)
+    metrics.increment("template_matches_total", labels={"result": "hit" if state.is_template_hit else "miss"})
+    return state
 
 def generate_query_node(state):
         prompt = f"""
@@ -26,7 +67,8 @@ def generate_query_node(state):
         The MongoDB database stores data for a project management system. 
         The context below describes the schema of the collections and their fields.
 
-        Context (schema description): {state.context}
+        Context (schema description):
+        {context_builder.render_context(state.context)}
 
         User question: {state.prompt}
 
@@ -44,28 +86,15 @@ def generate_query_node(state):
         {EXAMPLE_QUERY_JSON}
         """
         response=services.llm.invoke(prompt)
+        record_llm_usage("generate", response)
         state.raw_query=response.content
         return state
 
-def validate_query_node(state):
-    
+def check_query_shape(query):
     errors={}
-    try:
-        state.cleaned_raw_query=clean_raw_query.clean_query(state.raw_query)
-        
-        query=json.loads(state.cleaned_raw_query)
-        
-    except json.JSONDecodeError as e:
-        state.query={}
-    
-        state.error.setdefault(state.cleaned_raw_query, []).append({
-            "message": f"Invalid JSON format: {e}"
-        })
-        state.is_error=True
-        return state
-        
     if not isinstance(query,dict):
         errors["query_type"] = "Query must be a JSON object (dict)."
+        return errors
     
     if "collection" not in query or not query.get("collection"):
         errors["collection"] = "Missing or empty 'collection' field."
@@ -78,6 +107,47 @@ def validate_query_node(state):
         for idx,stage in enumerate(query["aggregate"]):
             if not isinstance(stage,dict):
                 errors[f"aggregate_stage_{idx}"] = f"Stage {idx} in 'aggregate' is not a dict."
+    return errors
+
+def repair_query(state):
+    query,repairs=clean_raw_query.repair_query(state.raw_query)
+    if query is None or check_query_shape(query):
+        return None
+    try:
+        cleaned_raw_query=json.dumps(query, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    
+    for repair in repairs:
+        metrics.increment("query_repairs_total", labels={"repair": repair})
+    metrics.increment("llm_retries_saved_total")
+    logger.debug("repaired query locally with %s", repairs)
+    state.cleaned_raw_query=cleaned_raw_query
+    return query
+
+def validate_query_node(state):
+    
+    try:
+        state.cleaned_raw_query=clean_raw_query.clean_query(state.raw_query)
+        
+        query=json.loads(state.cleaned_raw_query)
+        
+    except json.JSONDecodeError as e:
+        query=repair_query(state)
+        if query is None:
+            state.query={}
+        
+            state.error.setdefault(state.cleaned_raw_query, []).append({
+                "message": f"Invalid JSON format: {e}"
+            })
+            state.is_error=True
+            return state
+        
+    errors=check_query_shape(query)
+    if errors:
+        repaired=repair_query(state)
+        if repaired is not None:
+            query,errors=repaired,{}
     
     if errors:
         state.query={}
@@ -89,7 +159,37 @@ def validate_query_node(state):
         state.is_error=True
     else:
         state.query=clean_raw_query.parse_and_convert_query(query)
-        print(state.query)
+        logger.debug("validated query: %s", state.query)
+        if settings.schema_validation_enabled:
+            check_schema(state)
+    return state
+
+def check_schema(state):
+    # Catches unknown collections and fields before the query costs a round trip to MongoDB
+    errors=services.schema_validator.validate(state.query)
+    metrics.increment("schema_validations_total", labels={"result": "error" if errors else "ok"})
+    if errors:
+        state.error.setdefault(state.cleaned_raw_query, []).append({
+            "schema": errors
+        })
+        state.is_error=True
+
+def guard_query_node(state):
+    query=state.query
+    pipeline,options,errors,warnings=services.query_guard.check(services.db,
+                                                                query.get("collection"),
+                                                                query["aggregate"])
+    state.query_warnings=warnings
+    if errors:
+        metrics.increment("query_guard_rejections_total")
+        state.error.setdefault(state.cleaned_raw_query, []).append({
+            "query_guard": errors
+        })
+        state.is_error=True
+        return state
+
+    state.query={**query, "aggregate": pipeline}
+    state.query_options=options
     return state
 
 def execute_query_node(state):
@@ -99,9 +199,9 @@ def execute_query_node(state):
         collection=services.db[collection_name]
         
         pipeline=query["aggregate"]
-        result=list(collection.aggregate(pipeline))
-        
-        state.result=debug_state.convert_objectid(result)
+        state.result,state.next_page_token=result_pages.fetch_preview(collection,pipeline,
+                                                                      settings.result_preview_limit,
+                                                                      **state.query_options)
         return state
     
     except PyMongoError as e:
@@ -110,6 +210,7 @@ def execute_query_node(state):
         }}) 
         state.is_error=True
         state.result=[]
+        state.next_page_token=None
         return state
     
     except Exception as e:
@@ -117,15 +218,19 @@ def execute_query_node(state):
         state.error.setdefault(state.cleaned_raw_query, []).append({"unexpected_error": str(e)})
         state.is_error=True
         state.result=[]
+        state.next_page_token=None
         return state
         
 def handle_error_node(state):
-    print(len(state.error))
+    logger.debug("fixing query after %d errors", len(state.error))
     if state.error:
+        if not state.context:
+            retrieve_node(state)
         fix_prompt = f"""
             Prompt: {state.prompt}
             Error: {state.error}
-            Context: {state.context}
+            Context:
+            {context_builder.render_context(state.context)}
 
             Task:
             - Based on the Prompt, the Error, and the Context, fix the MongoDB query.
@@ -141,13 +246,23 @@ def handle_error_node(state):
             """
         
         response=services.llm.invoke(fix_prompt)
+        record_llm_usage("fix", response)
         state.raw_query=response.content
     state.is_error=False
     state.llm_retry_count+=1
+    metrics.increment("pipeline_llm_retries_total")
      
     return state
     
 def result_node(state):
+    # Only a run that gets here executed its query, confirm and paging check this flag
+    state.is_executed=True
+    if settings.index_advisor_enabled and state.query:
+        services.index_advisor.submit(state.query.get("collection"),state.query["aggregate"])
+    
+    # The embedding is only needed within a run, keep it out of the persisted checkpoint
+    state.prompt_embedding=[]
+    
     if not state.result:
         state.result = [{"NOT FOUND": "No document found"}]
     
@@ -155,13 +270,16 @@ def result_node(state):
     store_history_chat.add_chat(services.redis,
                                         state.session_id,
                                         state.prompt,
-                                        state.result)
+                                        state.result,
+                                        max_turns=settings.history_max_turns,
+                                        ttl=settings.history_ttl)
     
-    print_state(state)
+    log_state(state)
     return state
 
 def rewrite_prompt_node(state):
-    history_chat=store_history_chat.get_chat(services.redis,state.session_id)
+    history_chat=store_history_chat.get_chat(services.redis,state.session_id,
+                                             last_n=settings.history_prompt_turns)
     rewrite_prompt = f"""
         You are a helpful assistant that rewrites user queries.
 
@@ -183,13 +301,17 @@ def rewrite_prompt_node(state):
         }}
         """
     response=services.llm.invoke(rewrite_prompt)
+    record_llm_usage("rewrite", response)
+    metrics.increment("pipeline_user_retries_total")
     raw_prompt=clean_raw_query.clean_query(response.content)
-    print(raw_prompt)
+    logger.debug("rewritten prompt: %s", raw_prompt)
     json_prompt=json.loads(raw_prompt)
     state.prompt=json_prompt.get("prompt")
     return state
 
 def error_node(state):
+    metrics.increment("pipeline_retry_limit_reached_total")
     state.result = [{"Error": "Pipeline đã đạt mức giới hạn thử lại, hãy mô tả rõ ràng hơn"}]
-    print_state(state)
+    state.prompt_embedding=[]
+    log_state(state)
     return state
@@ -1,23 +1,148 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
-from helper.model_embedding import VectorSearch
+from helper.model_embedding import GemmEmbedding, VectorSearch, LocalVectorSearch
 from configs.settings import settings
-from pymongo import MongoClient 
-from redis import Redis
+from helper.connections import get_mongo_client, get_redis
 from helper.translate_model import Translator
+from helper.semantic_cache import SemanticCache
+from helper.translation_cache import CachedTranslator
+from helper.llm_cache import CachedLLM
+from helper.query_guard import QueryGuard
+from helper.schema_validator import SchemaValidator
+from helper.index_advisor import IndexAdvisor
+from helper.redis_checkpointer import RedisCheckpointSaver
+from helper.guideline_store import GuidelineStore
+from langgraph.checkpoint.memory import MemorySaver
+import threading
+import time
+
 class Services:
     def __init__(self):
-        self.llm=ChatGoogleGenerativeAI(model=settings.model_registry["gemini"],
-                            api_key=settings.gemini_ai_api_key,
-                            temperature=0,
-                            timeout=60)
-        
-        self.vector_search=VectorSearch()
-        self.translator=Translator()
-        self.client=MongoClient(settings.atlas_connection_string)
-        self.db=self.client[settings.atlas_db_name]
-        
-        self.redis=Redis(host=settings.redis_host,port=settings.redis_port,
-                         decode_responses=True,db=0,username=settings.redis_username,password=settings.redis_password)
+        self.lock=threading.RLock()
+        self.instances={}
+        self.timings={}
+        self.created_at=time.perf_counter()
+        self.ready_after=None
+
+    def get_or_create(self, name, factory):
+        instance=self.instances.get(name)
+        if instance is not None:
+            return instance
+        with self.lock:
+            if name not in self.instances:
+                start=time.perf_counter()
+                self.instances[name]=factory()
+                self.timings[name]=time.perf_counter()-start
+                # Ready as soon as everything a request needs is loaded, through warm_up or lazily
+                if self.ready_after is None and all(required in self.instances for required in self.required()):
+                    self.ready_after=time.perf_counter()-self.created_at
+            return self.instances[name]
+
+    def required(self):
+        names=["llm", "embedder", "vector_search", "client", "redis", "translator", "query_guard"]
+        if settings.semantic_cache_enabled:
+            names.append("semantic_cache")
+        if settings.schema_validation_enabled:
+            names.append("schema_validator")
+        return names
+
+    @property
+    def llm(self):
+        return self.get_or_create("llm", self.create_llm)
+
+    def create_llm(self):
+        llm=ChatGoogleGenerativeAI(model=settings.model_registry["gemini"],
+                                   api_key=settings.gemini_ai_api_key,
+                                   temperature=0,
+                                   timeout=60)
+        if not settings.llm_cache_enabled:
+            return llm
+        return CachedLLM(llm, model=settings.model_registry["gemini"],
+                         redis=self.redis if settings.llm_cache_redis else None,
+                         max_size=settings.llm_cache_size,
+                         ttl=settings.llm_cache_ttl)
+
+    @property
+    def embedder(self):
+        return self.get_or_create("embedder", lambda: GemmEmbedding(batching=settings.inference_batching))
+
+    @property
+    def vector_search(self):
+        if settings.retriever_backend=="local":
+            return self.get_or_create("vector_search", lambda: LocalVectorSearch(embedder=self.embedder))
+        return self.get_or_create("vector_search", lambda: VectorSearch(embedder=self.embedder))
+
+    @property
+    def client(self):
+        return self.get_or_create("client", get_mongo_client)
+
+    @property
+    def db(self):
+        return self.client[settings.atlas_db_name]
+
+    @property
+    def redis(self):
+        return self.get_or_create("redis", get_redis)
+
+    @property
+    def checkpointer(self):
+        if settings.checkpointer_backend=="memory":
+            return self.get_or_create("checkpointer", MemorySaver)
+        return self.get_or_create("checkpointer", lambda: RedisCheckpointSaver(
+            get_redis(decode_responses=False),
+            ttl=settings.checkpoint_ttl,
+            keep_last=settings.checkpoint_keep_last))
+
+    @property
+    def translator(self):
+        return self.get_or_create("translator", lambda: CachedTranslator(Translator(batching=settings.inference_batching),
+                                         redis=self.redis if settings.translation_cache_redis else None,
+                                         max_size=settings.translation_cache_size,
+                                         ttl=settings.translation_cache_ttl))
+
+    @property
+    def semantic_cache(self):
+        return self.get_or_create("semantic_cache", lambda: SemanticCache(threshold=settings.semantic_cache_threshold,
+                                          max_size=settings.semantic_cache_max_size,
+                                          ttl=settings.semantic_cache_ttl))
+
+    @property
+    def query_guard(self):
+        return self.get_or_create("query_guard", lambda: QueryGuard(policy=settings.query_guard_policy,
+                                        max_documents=settings.query_max_documents,
+                                        max_time_ms=settings.query_max_time_ms,
+                                        allow_disk_use=settings.query_allow_disk_use,
+                                        max_lookups=settings.query_max_lookups,
+                                        collscan_threshold=settings.query_collscan_threshold,
+                                        use_explain=settings.query_guard_explain,
+                                        count_ttl=settings.query_count_ttl))
+
+    @property
+    def schema_validator(self):
+        return self.get_or_create("schema_validator", SchemaValidator)
+
+    @property
+    def guideline_store(self):
+        return self.get_or_create("guideline_store", GuidelineStore)
+
+    @property
+    def index_advisor(self):
+        return self.get_or_create("index_advisor", lambda: IndexAdvisor(self.db,
+                                        self.client[settings.atlas_db_rag][settings.index_advisor_collection],
+                                        queue_size=settings.index_advisor_queue_size,
+                                        flush_interval=settings.index_advisor_flush_interval))
+
+    def warm_up(self):
+        for name in self.required():
+            getattr(self, name)
+        return self.startup_report()
+
+    def startup_report(self):
+        return {
+            "ready": self.ready_after is not None,
+            "ready_after_seconds": self.ready_after,
+            "loaded": sorted(self.instances),
+            "load_seconds": dict(self.timings)
+        }
+
 services=Services()
-        
\ No newline at end of file
@@ -1,7 +1,10 @@
 from pydantic import BaseModel
-from typing import List, Dict,Any
+from typing import List, Dict,Any,Optional
 from helper.debug_state import convert_objectid
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 class State(BaseModel):
     session_id: str=""
@@ -11,21 +14,30 @@ class State(BaseModel):
     raw_query: str = ""
     cleaned_raw_query: str=""
     query: Dict = {}
+    query_options: Dict[str, Any] = {}
+    query_warnings: List[str] = []
     error: Dict[str, List[Dict[str, Any]]] = {}
     is_error: bool= False
     llm_retry_count: int = 0
     user_retry_count: int =0
     result: list[dict] = []
+    next_page_token: Optional[str] = None
     is_again: bool = False
+    prompt_embedding: List[float] = []
+    is_cache_hit: bool = False
+    is_template_hit: bool = False
+    is_executed: bool = False
     
-def print_state(state: State):
-    print("session_id:",state.session_id)
-    print("prompt:", state.prompt)
-    print("translated:", state.translated)
-    print("context:", json.dumps(state.context, ensure_ascii=False, indent=2))
-    print("cleaned_raw_query:", state.cleaned_raw_query)
-    print("query:", json.dumps(convert_objectid(state.query), ensure_ascii=False, indent=2))
-    print("error:", json.dumps(state.error, ensure_ascii=False, indent=2) if state.error else None)
-    print("is_error:",state.is_error)
-    print("llm_retry_count:",state.llm_retry_count)
-    print("is_again:",state.is_again)
\ No newline at end of file
+def log_state(state: State):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug("session_id: %s", state.session_id)
+    logger.debug("prompt: %s", state.prompt)
+    logger.debug("translated: %s", state.translated)
+    logger.debug("context: %s", json.dumps(state.context, ensure_ascii=False, indent=2))
+    logger.debug("cleaned_raw_query: %s", state.cleaned_raw_query)
+    logger.debug("query: %s", json.dumps(convert_objectid(state.query), ensure_ascii=False, indent=2))
+    logger.debug("error: %s", json.dumps(state.error, ensure_ascii=False, indent=2) if state.error else None)
+    logger.debug("is_error: %s", state.is_error)
+    logger.debug("llm_retry_count: %s", state.llm_retry_count)
+    logger.debug("is_again: %s", state.is_again)
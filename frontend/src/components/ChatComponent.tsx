@@ -20,6 +20,7 @@ export const ChatComponent: React.FC = () => {
   const [loading, setLoading] = useState(false);
   const [showConfirmation, setShowConfirmation] = useState(false);
   const [lastBotMessage, setLastBotMessage] = useState("");
+  const [sessionId, setSessionId] = useState("");
 
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
 
@@ -50,7 +51,8 @@ export const ChatComponent: React.FC = () => {
       const response = await axios.post(`${API_URL}/text2query`, {
         prompt: message,
       });
-      const botResponse = response.data;
+      const botResponse = response.data.result;
+      setSessionId(response.data.session_id);
       addMessage(botResponse, false);
       setLastBotMessage(botResponse);
       setShowConfirmation(true);
@@ -68,6 +70,7 @@ export const ChatComponent: React.FC = () => {
   const handleConfirm = async () => {
     try {
       const response = await axios.post(`${API_URL}/confirm_query`, {
+        session_id: sessionId,
         is_confirm: true,
       });
 
@@ -90,6 +93,7 @@ export const ChatComponent: React.FC = () => {
       setLoading(true);
 
       const response = await axios.post(`${API_URL}/confirm_query`, {
+        session_id: sessionId,
         is_confirm: false,
         new_prompt: newPrompt,
       });
@@ -97,8 +101,10 @@ export const ChatComponent: React.FC = () => {
       if (response.status === 200) {
         addMessage(newPrompt, true);
         if (response.data) {
-          addMessage(response.data, false);
-          setLastBotMessage(response.data);
+          const botResponse = response.data.result;
+          setSessionId(response.data.session_id);
+          addMessage(botResponse, false);
+          setLastBotMessage(botResponse);
         }
         addMessage("✅ Câu truy vấn mới đã được gửi.", false, true);
         // Keep confirmation bar visible for further editing or confirmation